@@ -5,15 +5,34 @@ import json
 import sys
 import uuid
 from scipy import ndimage
-from scipy.interpolate import griddata
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, send_from_directory
+from scipy.interpolate import LinearNDInterpolator
+from scipy.spatial import Delaunay
+from flask import Flask, Response, render_template, request, jsonify, send_file, redirect, url_for, send_from_directory
 from werkzeug.utils import secure_filename
 import threading
 import time
 import shutil
 import zipfile
+import gzip
 import glob
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import colorsys
+from string import Template
+
+# Optional: Polars for the CSV read (falls back to pandas)
+try:
+    import polars as pl
+    HAVE_POLARS = True
+except ImportError:
+    HAVE_POLARS = False
+
+# Optional: Numba JIT for the mesh-building kernel (falls back to NumPy)
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
 
 
 app = Flask(__name__,static_folder='static', static_url_path='/static')
@@ -27,8 +46,45 @@ for folder in [app.config['UPLOAD_FOLDER'], app.config['PROCESSED_FOLDER']]:
     if not os.path.exists(folder):
         os.makedirs(folder)
 
-# Processing status tracking
+# Processing status tracking; job_updates is notified on every change so /events can push it
 processing_jobs = {}
+job_updates = threading.Condition()
+
+def update_job(job_id, **fields):
+    """Update a job's status fields and wake any event streams watching it"""
+    with job_updates:
+        job = processing_jobs.get(job_id)
+        if job is None:
+            # Job was cleaned up while its worker was still reporting
+            return
+        job.update(fields)
+        job_updates.notify_all()
+
+# Chunked uploads in progress, keyed by the job ID they will become. Each entry
+# carries its own lock (chunks for one upload are appended one at a time) and the
+# time of its last chunk; uploads idle longer than CHUNKED_UPLOAD_TIMEOUT are reaped
+chunked_uploads = {}
+chunked_uploads_lock = threading.Lock()
+CHUNKED_UPLOAD_TIMEOUT = 60 * 60  # seconds
+
+def reap_stale_uploads():
+    """Forget chunked uploads that stopped receiving chunks and delete their partial files"""
+    cutoff = time.time() - CHUNKED_UPLOAD_TIMEOUT
+    with chunked_uploads_lock:
+        stale = [upload_id for upload_id, upload in chunked_uploads.items()
+                 if upload['touched'] < cutoff and not upload['lock'].locked()]
+        stale = [chunked_uploads.pop(upload_id) for upload_id in stale]
+    for upload in stale:
+        try:
+            os.remove(upload['filepath'])
+        except OSError:
+            pass
+
+# Rendered upload page (plain and gzip bodies); it only depends on module-level defaults
+index_page_cache = {}
+
+# Output files written without compression in the download zip (binary, near-incompressible)
+STORED_ZIP_EXTENSIONS = {'.ply', '.bin', '.glb'}
 
 # --- DEFAULT SETTINGS ---
 DEFAULT_SETTINGS = {
@@ -146,143 +202,327 @@ COLOR_PALETTES = {
                      [168, 218, 220], [69, 123, 157], [29, 53, 87]],
 }
 
-def interpolate_color(palette, value):
-    """Interpolate color from palette for a value between 0 and 1"""
-    if len(palette) == 1:
-        return palette[0]
-    
-    val_scaled = value * (len(palette) - 1)
-    idx = int(val_scaled)
-    
-    if idx >= len(palette) - 1:
-        return palette[-1]
-    
-    t = val_scaled - idx
-    c1 = np.array(palette[idx])
-    c2 = np.array(palette[idx + 1])
-    
-    # Smooth interpolation
-    return (c1 * (1 - t) + c2 * t).astype(int).tolist()
+# uint8 lookup tables for the palettes above, built once at import
+PALETTE_LUTS = {name: np.array(colors, dtype=np.uint8) for name, colors in COLOR_PALETTES.items()}
 
-def get_color_from_palette(value, palette_name='Viridis'):
+def interpolate_colors(palette, values, out=None):
     """
-    Get RGB color for a normalized value (0-1) or index from a palette.
-    Returns [r, g, b] as 0-255 integers.
+    Interpolate colors from a palette: map an array of values in [0, 1] to (N, 3)
+    RGB scaled to 0-1. Writes into `out` (float32 by default) when given.
     """
-    palette = COLOR_PALETTES.get(palette_name, COLOR_PALETTES['Viridis'])
-    
-    if isinstance(value, (int, np.integer)):
-        # For discrete iso levels
-        idx = value % len(palette)
-        return palette[idx]
-    else:
-        # For continuous values 0-1
-        return interpolate_color(palette, float(value))
-
-def write_ply_fast(filename, points, colors):
-    """Write points and colors to a PLY file"""
-    header = f"""ply
-format ascii 1.0
-element vertex {len(points)}
-property float x
-property float y
-property float z
-property uchar red
-property uchar green
-property uchar blue
-end_header
-"""
-    data = np.column_stack([points, colors.astype(np.uint8)])
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(header)
-        np.savetxt(f, data, fmt='%.6f %.6f %.6f %d %d %d')
-
-def write_obj_mesh(filename, vertices, faces, vertex_colors=None):
-    """Write mesh to OBJ file with optional vertex colors"""
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(f"# OBJ file with {len(vertices)} vertices and {len(faces)} faces\n")
-        
-        # Write vertices (with colors as comments for reference)
-        for i, v in enumerate(vertices):
-            if vertex_colors is not None:
-                c = vertex_colors[i]
-                f.write(f"v {v[0]:.6f} {v[1]:.6f} {v[2]:.6f} {c[0]:.4f} {c[1]:.4f} {c[2]:.4f}\n")
-            else:
-                f.write(f"v {v[0]:.6f} {v[1]:.6f} {v[2]:.6f}\n")
-        
-        # Write faces (OBJ uses 1-based indexing)
-        for face in faces:
-            f.write(f"f {face[0]+1} {face[1]+1} {face[2]+1}\n")
+    pal = np.asarray(palette, dtype=np.float64)
+    values = np.ravel(values)
+    if out is None:
+        out = np.empty((values.size, 3), dtype=np.float32)
+    
+    if len(pal) == 1:
+        out[:] = pal[0] / 255.0
+        return out
+    
+    val_scaled = values * (len(pal) - 1)
+    idx = np.clip(val_scaled.astype(int), 0, len(pal) - 2)
+    t = np.clip(val_scaled - idx, 0.0, 1.0)[:, None]
+    
+    # Blend neighbouring entries, truncated to whole 0-255 values
+    rgb = pal[idx] * (1 - t)
+    rgb += pal[idx + 1] * t
+    np.trunc(rgb, out=rgb)
+    np.divide(rgb, 255.0, out=out)
+    return out
+
+def write_point_buffer(filename, layer_points, layer_colors):
+    """
+    Write every layer into one binary buffer, 8 bytes per point in layer order:
+    a uint32 block of positions quantized to 10:10:10 bits over the bounding box,
+    then a uint8 block of r, g, b, layer index. Returns each layer's (start, count)
+    in points and the {'min', 'scale'} needed to decode positions.
+    """
+    n = sum(len(points) for points in layer_points)
+    if n == 0:
+        open(filename, 'wb').close()
+        return [(0, 0) for _ in layer_points], {'min': [0.0, 0.0, 0.0], 'scale': [1.0, 1.0, 1.0]}
+    
+    # Pack straight into the output file through a memory map; no in-memory copy of the buffer
+    out = np.memmap(filename, dtype=np.uint8, mode='w+', shape=(8 * n,))
+    packed = out[:4 * n].view('<u4')
+    rgbl = out[4 * n:].reshape(n, 4)
+    
+    lo = np.min([points.min(axis=0) for points in layer_points if len(points)], axis=0).astype(np.float64)
+    hi = np.max([points.max(axis=0) for points in layer_points if len(points)], axis=0).astype(np.float64)
+    scale = np.where(hi > lo, (hi - lo) / 1023, 1.0)
+    
+    layer_ranges = []
+    start = 0
+    for i, (points, colors) in enumerate(zip(layer_points, layer_colors)):
+        end = start + len(points)
+        q = np.rint((points - lo) / scale).astype(np.uint32)
+        packed[start:end] = q[:, 0] | (q[:, 1] << 10) | (q[:, 2] << 20)
+        rgbl[start:end, :3] = colors
+        rgbl[start:end, 3] = i
+        layer_ranges.append((start, len(points)))
+        start = end
+    
+    out.flush()
+    del packed, rgbl, out
+    return layer_ranges, {'min': lo.tolist(), 'scale': scale.tolist()}
+
+def srgb_to_linear(c):
+    """Convert 0-1 sRGB color components to linear (glTF vertex colors are linear)"""
+    c = np.asarray(c, dtype=np.float32)
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4).astype(np.float32)
+
+def write_glb_mesh(filename, vertices, faces, vertex_colors=None):
+    """
+    Write a triangle mesh as binary glTF 2.0 (.glb): float32 positions, optional
+    float32 linear COLOR_0 from 0-1 sRGB colors, and uint32 indices.
+    """
+    positions = np.ascontiguousarray(vertices, dtype='<f4')
+    indices = np.ascontiguousarray(faces, dtype='<u4')
+    arrays = [positions, indices]
+    attributes = {'POSITION': 0}
+    accessors = [
+        {'bufferView': 0, 'componentType': 5126, 'count': len(positions), 'type': 'VEC3',
+         'min': positions.min(axis=0).tolist(), 'max': positions.max(axis=0).tolist()},
+        {'bufferView': 1, 'componentType': 5125, 'count': indices.size, 'type': 'SCALAR'},
+    ]
+    targets = [34962, 34963]  # ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER
+    if vertex_colors is not None:
+        arrays.append(np.ascontiguousarray(srgb_to_linear(vertex_colors), dtype='<f4'))
+        attributes['COLOR_0'] = 2
+        accessors.append({'bufferView': 2, 'componentType': 5126, 'count': len(positions), 'type': 'VEC3'})
+        targets.append(34962)
+    
+    # Every component is 4 bytes, so the views pack back to back and stay aligned
+    buffer_views = []
+    offset = 0
+    for arr, target in zip(arrays, targets):
+        buffer_views.append({'buffer': 0, 'byteOffset': offset, 'byteLength': arr.nbytes, 'target': target})
+        offset += arr.nbytes
+    
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'GPR VR Processor'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}],
+        'meshes': [{'primitives': [{'attributes': attributes, 'indices': 1, 'mode': 4}]}],
+        'accessors': accessors,
+        'bufferViews': buffer_views,
+        'buffers': [{'byteLength': offset}],
+    }
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    
+    with open(filename, 'wb') as f:
+        total = 12 + 8 + len(json_chunk) + 8 + offset
+        np.array([0x46546C67, 2, total, len(json_chunk), 0x4E4F534A], dtype='<u4').tofile(f)
+        f.write(json_chunk)
+        np.array([offset, 0x004E4942], dtype='<u4').tofile(f)
+        for arr in arrays:
+            arr.tofile(f)
+
+def grid_faces(resolution):
+    """Triangle indices for a row-major resolution x resolution vertex grid (two per cell)"""
+    i, j = np.mgrid[0:resolution - 1, 0:resolution - 1]
+    idx = (i * resolution + j).ravel()
+    faces = np.empty((idx.size * 2, 3), dtype=np.int32)
+    faces[0::2] = np.stack([idx, idx + 1, idx + resolution], axis=1)
+    faces[1::2] = np.stack([idx + 1, idx + resolution + 1, idx + resolution], axis=1)
+    return faces
+
+if HAVE_NUMBA:
+    # Serial on purpose: it runs from job worker threads, where Numba's parallel
+    # threading layers hang at exit (TBB) or abort on concurrent calls (workqueue)
+    @njit(fastmath=True, cache=True)
+    def build_mesh_arrays_jit(xi, yi, zi_grid, amp_norm, palette, vertices, colors, faces):
+        """Fill vertex, palette-color and face buffers for a square grid in one pass"""
+        res = xi.shape[0]
+        n_pal = palette.shape[0]
+        for i in range(res):
+            for j in range(res):
+                idx = i * res + j
+                vertices[idx, 0] = xi[j]
+                vertices[idx, 1] = yi[i]
+                vertices[idx, 2] = zi_grid[i, j]
+                
+                # Same blend and int truncation as interpolate_colors
+                if n_pal == 1:
+                    k, t = 0, 0.0
+                else:
+                    val_scaled = amp_norm[i, j] * (n_pal - 1)
+                    k = min(max(int(val_scaled), 0), n_pal - 2)
+                    t = min(max(val_scaled - k, 0.0), 1.0)
+                for c in range(3):
+                    if n_pal == 1:
+                        rgb = palette[0, c]
+                    else:
+                        rgb = palette[k, c] * (1 - t) + palette[k + 1, c] * t
+                    colors[idx, c] = int(rgb) / 255.0
+                
+                # Two triangles per grid cell
+                if i < res - 1 and j < res - 1:
+                    f = 2 * (i * (res - 1) + j)
+                    faces[f, 0] = idx
+                    faces[f, 1] = idx + 1
+                    faces[f, 2] = idx + res
+                    faces[f + 1, 0] = idx + 1
+                    faces[f + 1, 1] = idx + res + 1
+                    faces[f + 1, 2] = idx + res
+
+if HAVE_NUMBA:
+    @njit(cache=True)
+    def group_by_bin_jit(labels, n_bins, order, offsets):
+        """Counting sort of row indices by bin label into order; offsets[b]:offsets[b+1] is bin b"""
+        for i in range(labels.shape[0]):
+            b = labels[i]
+            if b >= 0 and b < n_bins:
+                offsets[b + 1] += 1
+        for b in range(n_bins):
+            offsets[b + 1] += offsets[b]
+        fill = offsets[:-1].copy()
+        for i in range(labels.shape[0]):
+            b = labels[i]
+            if b >= 0 and b < n_bins:
+                order[fill[b]] = i
+                fill[b] += 1
+
+def group_by_bin(labels, n_bins):
+    """
+    Row indices grouped by integer bin label (file order kept within a bin) and the
+    n_bins + 1 offsets delimiting each bin; labels outside 0..n_bins-1 are dropped
+    """
+    labels = np.ascontiguousarray(labels, dtype=np.int64)
+    offsets = np.zeros(n_bins + 1, dtype=np.int64)
+    if HAVE_NUMBA:
+        order = np.empty(len(labels), dtype=np.int64)
+        group_by_bin_jit(labels, n_bins, order, offsets)
+        return order[:offsets[-1]], offsets
+    
+    valid = np.flatnonzero((labels >= 0) & (labels < n_bins))
+    order = valid[np.argsort(labels[valid], kind='stable')]
+    np.cumsum(np.bincount(labels[valid], minlength=n_bins), out=offsets[1:])
+    return order, offsets
+
+def build_mesh_arrays(xi, yi, zi_grid, amp_norm, palette):
+    """
+    Vertices, faces and 0-1 palette colors for a square grid surface given its
+    1-D axes xi/yi (Numba kernel when available)
+    """
+    resolution = len(xi)
+    vertices = np.empty((resolution * resolution, 3), dtype=np.float32)
+    vertex_colors = np.empty((resolution * resolution, 3), dtype=np.float32)
+    if HAVE_NUMBA:
+        faces = np.empty((2 * (resolution - 1) ** 2, 3), dtype=np.int32)
+        build_mesh_arrays_jit(xi, yi, zi_grid, amp_norm,
+                              np.asarray(palette, dtype=np.float64), vertices, vertex_colors, faces)
+        return vertices, faces, vertex_colors
+    
+    # Create vertices (row-major over the grid), broadcasting the axes
+    grid = vertices.reshape(resolution, resolution, 3)
+    grid[:, :, 0] = xi[None, :]
+    grid[:, :, 1] = yi[:, None]
+    grid[:, :, 2] = zi_grid
+    
+    # Map normalized amplitude straight into the color buffer
+    interpolate_colors(palette, amp_norm, out=vertex_colors)
+    
+    # Create faces (two triangles per grid cell)
+    faces = grid_faces(resolution)
+    return vertices, faces, vertex_colors
+
+def smooth_grid(grid, sigma=1):
+    """Gaussian-smooth a 2-D grid in place as two 1-D passes sharing one scratch buffer"""
+    # Flat (e.g. all fill-value) grids are unchanged by the filter; skip both passes
+    if grid.size == 0 or np.ptp(grid) == 0:
+        return grid
+    tmp = np.empty_like(grid)
+    ndimage.gaussian_filter1d(grid, sigma, axis=0, output=tmp)
+    ndimage.gaussian_filter1d(tmp, sigma, axis=1, output=grid)
+    return grid
+
+def regular_grid_interp(x, y, values, xi_grid, yi_grid):
+    """
+    Fast path for points lying on a complete rectilinear acquisition grid.
+    Samples each array in `values` at (xi_grid, yi_grid) with map_coordinates
+    instead of Delaunay-triangulating the points. Returns None when the points
+    are not exactly one sample per cell on uniformly spaced axes.
+    """
+    ux, uy = np.unique(x), np.unique(y)
+    nx, ny = len(ux), len(uy)
+    if nx < 2 or ny < 2 or nx * ny != len(x):
+        return None
+    
+    dx, dy = np.diff(ux), np.diff(uy)
+    if not (np.allclose(dx, dx[0]) and np.allclose(dy, dy[0])):
+        return None
+    
+    # Every cell must be hit exactly once
+    cell = np.searchsorted(uy, y) * nx + np.searchsorted(ux, x)
+    if np.bincount(cell, minlength=nx * ny).min() != 1:
+        return None
+    
+    coords = np.stack(np.broadcast_arrays((yi_grid - uy[0]) / dy[0], (xi_grid - ux[0]) / dx[0]))
+    grids = np.empty((len(values),) + coords.shape[1:])
+    dense = np.empty(nx * ny)
+    for k, v in enumerate(values):
+        dense[cell] = v
+        ndimage.map_coordinates(dense.reshape(ny, nx), coords, output=grids[k], order=1, mode='nearest')
+    return grids
 
 def generate_surface_mesh(df, x_col, y_col, z_col, amp_col, resolution=100, palette_name='Viridis'):
     """Generate a surface mesh from GPR data"""
     print(f"  Generating surface mesh with {palette_name} palette...")
     
-    x = df[x_col].values
-    y = df[y_col].values
-    z = df[z_col].values
-    amp = df[amp_col].values
+    # Select the four columns once; x/y/z/amp are views into one array
+    xyza = df[[x_col, y_col, z_col, amp_col]].to_numpy(copy=False)
+    x, y, z, amp = xyza[:, 0], xyza[:, 1], xyza[:, 2], xyza[:, 3]
     
     # Create regular grid
-    xi = np.linspace(x.min(), x.max(), resolution)
-    yi = np.linspace(y.min(), y.max(), resolution)
-    xi_grid, yi_grid = np.meshgrid(xi, yi)
+    xi = np.linspace(float(x.min()), float(x.max()), resolution)
+    yi = np.linspace(float(y.min()), float(y.max()), resolution)
+    # Sparse (1, res) / (res, 1) grids; the interpolators broadcast them
+    xi_grid, yi_grid = np.meshgrid(xi, yi, sparse=True)
     
     # Interpolate Z values (use max amplitude depth at each point)
     print("    Interpolating surface...")
     
-    # For each grid cell, find the depth with maximum amplitude
-    zi_grid = np.zeros_like(xi_grid)
-    amp_grid = np.zeros_like(xi_grid)
-    
-    # Use griddata for interpolation
+    # Triangulated linear interpolation (or the regular-grid fast path)
     points = np.column_stack((x, y))
     
     try:
-        zi_grid = griddata(points, z, (xi_grid, yi_grid), method='linear', fill_value=z.mean())
-        amp_grid = griddata(points, amp, (xi_grid, yi_grid), method='linear', fill_value=0)
+        grids = regular_grid_interp(x, y, [z, amp], xi_grid, yi_grid)
+        if grids is not None:
+            zi_grid, amp_grid = grids
+        else:
+            # Triangulate once and reuse it for both depth and amplitude
+            tri = Delaunay(points)
+            zi_grid = LinearNDInterpolator(tri, z, fill_value=z.mean())((xi_grid, yi_grid))
+            amp_grid = LinearNDInterpolator(tri, amp, fill_value=0)((xi_grid, yi_grid))
     except Exception as e:
         print(f"    Warning: Interpolation issue - {e}")
-        zi_grid = np.full_like(xi_grid, z.mean())
-        amp_grid = np.full_like(xi_grid, amp.mean())
+        zi_grid = np.full((resolution, resolution), z.mean())
+        amp_grid = np.full((resolution, resolution), amp.mean())
     
-    # Smooth the surface
-    zi_grid = ndimage.gaussian_filter(zi_grid, sigma=1)
-    amp_grid = ndimage.gaussian_filter(amp_grid, sigma=1)
+    # Float32 is plenty for the GLB writer and Three.js; halves the bytes smoothed below.
+    # (The query grid stays float64 above so edge nodes don't round outside the hull.)
+    zi_grid = zi_grid.astype(np.float32, copy=False)
+    amp_grid = amp_grid.astype(np.float32, copy=False)
     
-    # Create vertices
-    vertices = []
-    vertex_colors = []
+    # Smooth the surface
+    zi_grid = smooth_grid(zi_grid, sigma=1)
+    amp_grid = smooth_grid(amp_grid, sigma=1)
     
-    # Normalize amplitude for coloring
+    # Normalize amplitude in place (amp_grid is not needed afterwards)
     amp_min, amp_max = amp_grid.min(), amp_grid.max()
+    amp_norm = amp_grid
     if amp_max > amp_min:
-        amp_norm = (amp_grid - amp_min) / (amp_max - amp_min)
+        np.subtract(amp_grid, amp_min, out=amp_norm)
+        np.divide(amp_norm, amp_max - amp_min, out=amp_norm)
     else:
-        amp_norm = np.zeros_like(amp_grid)
-    
-    for i in range(resolution):
-        for j in range(resolution):
-            vertices.append([xi_grid[i, j], yi_grid[i, j], zi_grid[i, j]])
-            
-            # Get color from selected palette
-            amp_val = amp_norm[i, j]
-            c_int = get_color_from_palette(amp_val, palette_name)
-            vertex_colors.append([c_int[0]/255.0, c_int[1]/255.0, c_int[2]/255.0])
+        amp_norm.fill(0)
     
-    vertices = np.array(vertices)
-    vertex_colors = np.array(vertex_colors)
-    
-    # Create faces (triangles)
-    faces = []
-    for i in range(resolution - 1):
-        for j in range(resolution - 1):
-            idx = i * resolution + j
-            # Two triangles per grid cell
-            faces.append([idx, idx + 1, idx + resolution])
-            faces.append([idx + 1, idx + resolution + 1, idx + resolution])
-    
-    faces = np.array(faces)
+    # Build vertices, palette colors and faces
+    palette = COLOR_PALETTES.get(palette_name, COLOR_PALETTES['Viridis'])
+    vertices, faces, vertex_colors = build_mesh_arrays(xi, yi, zi_grid, amp_norm, palette)
     
     print(f"    Created mesh: {len(vertices)} vertices, {len(faces)} faces")
     
@@ -297,343 +537,324 @@ def generate_depth_slices(df, x_col, y_col, z_col, amp_col, num_slices=5, resolu
     """Generate horizontal slice surfaces at different depths"""
     print(f"  Generating {num_slices} depth slices with {palette_name} palette...")
     
-    x = df[x_col].values
-    y = df[y_col].values
-    z = df[z_col].values
-    amp = np.abs(df[amp_col].values)
+    # Select the four columns once; x/y/z are views into one array
+    xyza = df[[x_col, y_col, z_col, amp_col]].to_numpy(copy=False)
+    x, y, z = xyza[:, 0], xyza[:, 1], xyza[:, 2]
+    amp = np.abs(xyza[:, 3])
     
     z_min, z_max = z.min(), z.max()
     slice_depths = np.linspace(z_max, z_min, num_slices + 2)[1:-1]  # Exclude top and bottom
     
-    slices = []
+    xi = np.linspace(float(x.min()), float(x.max()), resolution)
+    yi = np.linspace(float(y.min()), float(y.max()), resolution)
+    xi_grid, yi_grid = np.meshgrid(xi, yi, sparse=True)
     
-    xi = np.linspace(x.min(), x.max(), resolution)
-    yi = np.linspace(y.min(), y.max(), resolution)
-    xi_grid, yi_grid = np.meshgrid(xi, yi)
+    # Every slice shares the same grid topology
+    faces = grid_faces(resolution)
+    palette = COLOR_PALETTES.get(palette_name, COLOR_PALETTES['Viridis'])
+    
+    # Sort depths once so each slice only scans the points inside its tolerance band
+    depth_tolerance = (z_max - z_min) / (num_slices * 2)
+    z_order = np.argsort(z, kind='stable')
+    z_sorted = z[z_order]
     
-    for depth in slice_depths:
-        # Find points near this depth
-        depth_tolerance = (z_max - z_min) / (num_slices * 2)
-        mask = np.abs(z - depth) < depth_tolerance
+    def process_slice(depth):
+        """Interpolate, smooth and mesh one depth slice; None if too few points"""
+        # Find points near this depth (kept in original order)
+        lo = np.searchsorted(z_sorted, depth - depth_tolerance, side='left')
+        hi = np.searchsorted(z_sorted, depth + depth_tolerance, side='right')
+        idx = np.sort(z_order[lo:hi])
+        idx = idx[np.abs(z[idx] - depth) < depth_tolerance]
         
-        if mask.sum() < 10:
-            continue
+        if len(idx) < 10:
+            return None
         
         # Interpolate amplitude at this depth
-        points = np.column_stack((x[mask], y[mask]))
-        amp_slice = amp[mask]
+        points = np.column_stack((x[idx], y[idx]))
+        amp_slice = amp[idx]
         
         try:
-            amp_grid = griddata(points, amp_slice, (xi_grid, yi_grid), method='linear', fill_value=0)
-            amp_grid = ndimage.gaussian_filter(amp_grid, sigma=1)
+            grids = regular_grid_interp(x[idx], y[idx], [amp_slice], xi_grid, yi_grid)
+            if grids is not None:
+                amp_grid = grids[0]
+            else:
+                amp_grid = LinearNDInterpolator(points, amp_slice, fill_value=0)((xi_grid, yi_grid))
+            amp_grid = smooth_grid(amp_grid.astype(np.float32, copy=False), sigma=1)
         except:
-            amp_grid = np.zeros_like(xi_grid)
+            amp_grid = np.zeros((resolution, resolution), dtype=np.float32)
         
-        # Normalize for coloring
+        # Normalize for coloring (in place)
         amp_max = amp_grid.max()
+        amp_norm = amp_grid
         if amp_max > 0:
-            amp_norm = amp_grid / amp_max
+            np.divide(amp_grid, amp_max, out=amp_norm)
         else:
-            amp_norm = np.zeros_like(amp_grid)
+            amp_norm.fill(0)
         
         # Create vertices
-        vertices = []
-        vertex_colors = []
+        vertices = np.empty((resolution * resolution, 3), dtype=np.float32)
+        grid = vertices.reshape(resolution, resolution, 3)
+        grid[:, :, 0] = xi[None, :]
+        grid[:, :, 1] = yi[:, None]
+        grid[:, :, 2] = depth
         
-        for i in range(resolution):
-            for j in range(resolution):
-                vertices.append([xi_grid[i, j], yi_grid[i, j], depth])
-                
-                amp_val = amp_norm[i, j]
-                c_int = get_color_from_palette(amp_val, palette_name)
-                vertex_colors.append([c_int[0]/255.0, c_int[1]/255.0, c_int[2]/255.0])
-        
-        # Create faces
-        faces = []
-        for i in range(resolution - 1):
-            for j in range(resolution - 1):
-                idx = i * resolution + j
-                faces.append([idx, idx + 1, idx + resolution])
-                faces.append([idx + 1, idx + resolution + 1, idx + resolution])
-        
-        slices.append({
-            'depth': float(depth),
-            'vertices': np.array(vertices),
-            'faces': np.array(faces),
-            'colors': np.array(vertex_colors)
-        })
+        vertex_colors = np.empty((resolution * resolution, 3), dtype=np.float32)
+        interpolate_colors(palette, amp_norm, out=vertex_colors)
         
         print(f"    Slice at depth {depth:.3f}: {len(vertices)} vertices")
+        
+        return {
+            'depth': float(depth),
+            'vertices': vertices,
+            'faces': faces,
+            'colors': vertex_colors
+        }
+    
+    # Slices are independent and Qhull/ndimage release the GIL, so run them in threads
+    workers = max(1, min(len(slice_depths), os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        slices = [sl for sl in executor.map(process_slice, slice_depths) if sl is not None]
     
     return slices
 
+def merge_slice_meshes(slices):
+    """Concatenate depth slices into one vertex/face/color set so they draw as a single mesh"""
+    offsets = np.cumsum([0] + [len(sl['vertices']) for sl in slices[:-1]])
+    vertices = np.concatenate([sl['vertices'] for sl in slices])
+    faces = np.concatenate([sl['faces'] + offset for sl, offset in zip(slices, offsets)])
+    colors = np.concatenate([sl['colors'] for sl in slices])
+    return vertices, faces, colors
+
 def create_iso_colormap(iso_level, total_levels, palette_name='Viridis'):
-    """Wrapper for backward compatibility or direct use"""
-    return get_color_from_palette(iso_level, palette_name)
+    """uint8 RGB row of the palette lookup table for a discrete iso level"""
+    lut = PALETTE_LUTS.get(palette_name, PALETTE_LUTS['Viridis'])
+    return lut[iso_level % len(lut)]
 
-def generate_layer_loaders(ply_files, amplitude_ranges, output_dir, job_id):
-    """Generate JavaScript code to load PLY layers"""
-    loaders = []
-    for i, ply_file in enumerate(ply_files):
+def box_edge_positions(x_len, y_len, z_len):
+    """Flattened xyz vertex pairs for the 12 edges of an origin-centred box"""
+    half = np.array([x_len, y_len, z_len], dtype=np.float64) / 2
+    # Corner i takes the max on axis k when bit k is set; edges join corners one bit apart
+    corners = np.array([[(i >> k) & 1 for k in range(3)] for i in range(8)]) * 2 * half - half
+    edges = [(i, i | bit) for i in range(8) for bit in (1, 2, 4) if not i & bit]
+    return corners[np.array(edges)].ravel()
+
+def write_layer_manifest(layer_ranges, amplitude_ranges, output_dir, quantization, points_file='points.bin'):
+    """Write layers.json: the shared point buffer, its position decode and each layer's slice of it"""
+    layers = []
+    for i, (start, count) in enumerate(layer_ranges):
         amp_min, amp_max = amplitude_ranges[i]
-        filename = os.path.basename(ply_file)
-        loaders.append(f'''
-        layerPromises.push(
-            new Promise((resolve) => {{
-                plyLoader.load('/files/{job_id}/{filename}', (geometry) => {{
-                    const material = new THREE.PointsMaterial({{
-                        size: pointSize,
-                        vertexColors: true,
-                        sizeAttenuation: true
-                    }});
-                    
-                    const points = new THREE.Points(geometry, material);
-                    points.userData.layerIndex = {i};
-                    points.userData.amplitudeMin = {amp_min};
-                    points.userData.amplitudeMax = {amp_max};
-                    
-                    pointCloudGroup.add(points);
-                    
-                    // FIXED: Assign directly to index to match the checkbox ID
-                    layers[{i}] = points; 
-                    
-                    loadedCount++;
-                    updateLoadingProgress((loadedCount / totalFiles) * 100, 'Loaded layer {i+1}');
-                    resolve();
-                }},
-                undefined,
-                (error) => {{
-                    console.error('Error loading layer {i+1}:', error);
-                    loadedCount++;
-                    resolve();
-                }});
-            }})
-        );''')
-    return '\n'.join(loaders)
-
-def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, data_info, job_id,
-                     has_surface=False, surface_info=None, num_slices=0, total_files=0, pipe_file=None):
-    
-    # ... (Keep existing loader generation code at the top) ...
-    # Fix for potential missing total_files argument
-    if total_files == 0:
-        total_files = len(ply_files)
+        layers.append({
+            'index': i,
+            'start': int(start),
+            'count': int(count),
+            'amp_min': float(amp_min),
+            'amp_max': float(amp_max)
+        })
+    manifest = {
+        'file': points_file,
+        'count': int(sum(count for _, count in layer_ranges)),
+        'position_min': quantization['min'],
+        'position_scale': quantization['scale'],
+        'layers': layers
+    }
+    with open(os.path.join(output_dir, 'layers.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
 
-    amplitude_ranges = []
-    for i in range(len(ply_files)):
-        amp_min = data_info['amp_min'] + (i / len(ply_files)) * (data_info['amp_max'] - data_info['amp_min'])
-        amp_max = data_info['amp_min'] + ((i + 1) / len(ply_files)) * (data_info['amp_max'] - data_info['amp_min'])
-        amplitude_ranges.append((amp_min, amp_max))
-    
-    layer_loaders_js = generate_layer_loaders(ply_files, amplitude_ranges, output_dir, job_id)
-    
-    # Surface loading code
-    surface_loader_js = ""
-    if has_surface:
-        surface_loader_js = f'''
-        objLoader.load('/files/{job_id}/surface_amplitude.obj', (object) => {{
-            object.traverse((child) => {{
-                if (child.isMesh) {{
-                    child.material = new THREE.MeshStandardMaterial({{
-                        vertexColors: true, side: THREE.DoubleSide, transparent: true,
-                        opacity: surfaceOpacity, metalness: 0.1, roughness: 0.8
-                    }});
+# Viewer page and its optional loader snippets, compiled once at import and
+# filled per job with Template.substitute ($name placeholders; JS braces stay literal)
+SURFACE_LOADER_TEMPLATE = Template('''
+        gltfLoader.load('/files/$job_id/surface_amplitude.glb', (gltf) => {
+            const object = gltf.scene;
+            object.traverse((child) => {
+                if (child.isMesh) {
+                    child.geometry.computeVertexNormals();
+                    child.material = surfaceMaterial;
                     child.userData.isSurface = true; surfaces.push(child);
-                }}
-            }});
+                }
+            });
             surfaceGroup.add(object);
+            requestRender();
             console.log('Loaded amplitude surface');
-        }}, undefined, (error) => {{ console.log('No amplitude surface found'); }});
-        '''
-    
-    # Slice loading code (Keep existing)
-    slice_loader_js = ""
-    if num_slices > 0:
-        for i in range(num_slices):
-            slice_loader_js += f'''
-            objLoader.load('/files/{job_id}/slice_{i+1}.obj', (object) => {{
-                object.traverse((child) => {{
-                    if (child.isMesh) {{
-                        child.material = new THREE.MeshStandardMaterial({{
-                            vertexColors: true, side: THREE.DoubleSide, transparent: true,
-                            opacity: sliceOpacity, metalness: 0.1, roughness: 0.8
-                        }});
-                        child.userData.isSlice = true; child.userData.sliceIndex = {i}; slices.push(child);
-                    }}
-                }});
-                sliceGroup.add(object);
-                console.log('Loaded slice {i+1}');
-            }}, undefined, (error) => {{ console.log('Slice {i+1} not found'); }});
-            '''
-    
-    pipe_loader_js = ""
-    if pipe_file:
-        pipe_loader_js = f'''
+        }, undefined, (error) => { console.log('No amplitude surface found'); });
+        ''')
+
+SLICE_LOADER_TEMPLATE = Template('''
+        gltfLoader.load('/files/$job_id/slices.glb', (gltf) => {
+            const object = gltf.scene;
+            object.traverse((child) => {
+                if (child.isMesh) {
+                    child.geometry.computeVertexNormals();
+                    child.material = sliceMaterial;
+                    child.userData.isSlice = true; slices.push(child);
+                }
+            });
+            sliceGroup.add(object);
+            requestRender();
+            console.log('Loaded $num_slices depth slices');
+        }, undefined, (error) => { console.log('No depth slices found'); });
+        ''')
+
+PIPE_LOADER_TEMPLATE = Template('''
         const pipeGroup = new THREE.Group();
         pipeGroup.visible = false; // Hidden by default
         mainGroup.add(pipeGroup);
         
         // Pipe Loader
         const pipeLoader = new PLYLoader();
-        pipeLoader.load('/files/{job_id}/{pipe_file}', (geometry) => {{
+        pipeLoader.load('/files/$job_id/$pipe_file', (geometry) => {
             geometry.computeVertexNormals();
-            const material = new THREE.MeshStandardMaterial({{ 
+            const material = new THREE.MeshStandardMaterial({ 
                 color: 0xaaaaaa, metalness: 0.5, roughness: 0.5,
                 side: THREE.DoubleSide
-            }});
+            });
             const mesh = new THREE.Mesh(geometry, material);
             
             // Apply offset to align with centered GPR data
-            const offsetX = {data_info.get('offset_x', 0)};
-            const offsetY = {data_info.get('offset_y', 0)};
+            const offsetX = $offset_x;
+            const offsetY = $offset_y;
             mesh.position.set(-offsetX, -offsetY, 0);
             
             // Apply Data Scale Factor (if GPR was scaled down)
-            const sf = {data_info.get('scale_factor', 1.0)};
+            const sf = $scale_factor;
             mesh.scale.setScalar(sf);
             
             // Rotate 90 degrees to make it horizontal
             mesh.rotation.x = Math.PI / 2;
             
             pipeGroup.add(mesh);
+            requestRender();
             console.log('Loaded Pipe with offset', -offsetX, -offsetY, 'scale', sf, 'rotation 90 deg');
             
-        }}, undefined, (err) => {{ console.error('Pipe load error', err); }});
-        '''
-    
-    x_len = data_info['x_max'] - data_info['x_min']
-    y_len = data_info['y_max'] - data_info['y_min']
-    z_len = abs(data_info['z_max'] - data_info['z_min'])
-    ground_size = max(x_len, y_len) * 3
-    if ground_size < 50: ground_size = 50
+        }, undefined, (err) => { console.error('Pipe load error', err); });
+        ''')
 
-    html_content = f'''<!DOCTYPE html>
+VIEWER_TEMPLATE = Template('''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>GPR VR Explorer - {data_info['original_filename']}</title>
+    <title>GPR VR Explorer - $original_filename</title>
     
     <script type="importmap">
-    {{
-        "imports": {{
+    {
+        "imports": {
             "three": "https://unpkg.com/three@0.158.0/build/three.module.js",
             "three/addons/": "https://unpkg.com/three@0.158.0/examples/jsm/"
-        }}
-    }}
+        }
+    }
     </script>
     
     <style>
-        body {{ margin: 0; padding: 0; background: #1a1a1a; color: white; font-family: Arial, sans-serif; overflow: hidden; }}
-        #container {{ position: relative; width: 100vw; height: 100vh; }}
+        body { margin: 0; padding: 0; background: #1a1a1a; color: white; font-family: Arial, sans-serif; overflow: hidden; }
+        #container { position: relative; width: 100vw; height: 100vh; }
         
-        #info {{
+        #info {
             position: absolute; top: 20px; left: 20px;
             background: rgba(0,0,0,0.9); padding: 20px;
             border-radius: 10px; z-index: 100;
             max-width: 400px; max-height: 90vh; overflow-y: auto;
-        }}
+        }
         
-        #compass-ui {{
+        #compass-ui {
             position: absolute; top: 80px; right: 20px;
             width: 120px; height: 120px; z-index: 100;
             pointer-events: none;
-        }}
+        }
         
-        #vr-button {{
+        #vr-button {
             position: absolute; bottom: 20px; left: 50%;
             transform: translateX(-50%); padding: 15px 30px;
             font-size: 18px; background: #4CAF50; color: white;
             border: none; border-radius: 10px; cursor: pointer; z-index: 100;
-        }}
-        #vr-button:hover {{ background: #45a049; }}
-        #vr-button:disabled {{ background: #666; cursor: not-allowed; }}
+        }
+        #vr-button:hover { background: #45a049; }
+        #vr-button:disabled { background: #666; cursor: not-allowed; }
         
-        .slider-container {{ margin: 12px 0; }}
-        .slider-label {{ display: flex; justify-content: space-between; margin-bottom: 5px; font-size: 13px; }}
-        input[type="range"] {{ width: 100%; }}
-        .toggle-container {{ display: flex; align-items: center; margin: 8px 0; font-size: 13px; }}
-        .toggle-container input {{ margin-right: 10px; }}
+        .slider-container { margin: 12px 0; }
+        .slider-label { display: flex; justify-content: space-between; margin-bottom: 5px; font-size: 13px; }
+        input[type="range"] { width: 100%; }
+        .toggle-container { display: flex; align-items: center; margin: 8px 0; font-size: 13px; }
+        .toggle-container input { margin-right: 10px; }
         
         /* NEW STYLES FOR CHECKLIST */
-        #layer-list {{ 
+        #layer-list { 
             max-height: 150px; 
             overflow-y: auto; 
             background: rgba(255,255,255,0.05);
             border-radius: 5px;
             padding: 5px;
             margin-top: 5px; 
-        }}
-        .layer-item {{
+        }
+        .layer-item {
             display: flex;
             align-items: center;
             padding: 4px;
             border-bottom: 1px solid rgba(255,255,255,0.05);
             font-size: 11px;
-        }}
-        .layer-item:hover {{ background: rgba(255,255,255,0.1); }}
-        .layer-item input {{ margin-right: 8px; }}
-        .layer-label {{ cursor: pointer; flex: 1; display: flex; align-items: center; }}
-        .color-swatch {{
+        }
+        .layer-item:hover { background: rgba(255,255,255,0.1); }
+        .layer-item input { margin-right: 8px; }
+        .layer-label { cursor: pointer; flex: 1; display: flex; align-items: center; }
+        .color-swatch {
             display: inline-block; width: 12px; height: 12px;
             border-radius: 2px; margin-right: 8px; border: 1px solid #555;
-        }}
-        .btn-small {{
+        }
+        .btn-small {
             background: #444; color: white; border: 1px solid #666;
             padding: 2px 8px; font-size: 10px; cursor: pointer; border-radius: 3px;
             margin-right: 5px;
-        }}
-        .btn-small:hover {{ background: #555; }}
+        }
+        .btn-small:hover { background: #555; }
         
-        .section-header {{ background: rgba(255,255,255,0.1); padding: 8px; margin: 10px -10px; font-weight: bold; font-size: 13px; }}
+        .section-header { background: rgba(255,255,255,0.1); padding: 8px; margin: 10px -10px; font-weight: bold; font-size: 13px; }
         
-        #loading {{
+        #loading {
             position: fixed; top: 0; left: 0; width: 100%; height: 100%;
             background: rgba(0,0,0,0.95); display: flex; flex-direction: column;
             justify-content: center; align-items: center; z-index: 1000;
-        }}
-        #loading-text {{ font-size: 24px; margin-bottom: 20px; }}
-        #loading-progress {{ width: 300px; height: 20px; background: #333; border-radius: 10px; overflow: hidden; }}
-        #loading-bar {{ width: 0%; height: 100%; background: linear-gradient(90deg, #4CAF50, #8BC34A); transition: width 0.3s; }}
-        #loading-details {{ margin-top: 10px; font-size: 14px; color: #aaa; }}
-        
-        #debug {{ position: absolute; bottom: 80px; left: 20px; background: rgba(0,0,0,0.8); padding: 10px; border-radius: 5px; font-size: 11px; font-family: monospace; z-index: 100; }}
-        #data-info {{ background: rgba(0,100,200,0.2); padding: 8px; border-radius: 5px; margin-bottom: 10px; font-size: 11px; }}
-        .control-group {{ background: rgba(255,255,255,0.05); padding: 10px; border-radius: 5px; margin: 10px 0; }}
-        .control-group-title {{ font-weight: bold; margin-bottom: 8px; color: #4CAF50; font-size: 12px; display: flex; justify-content: space-between; align-items: center; }}
-        .file-info {{ font-size: 10px; color: #aaa; margin-top: 5px; border-top: 1px solid #333; padding-top: 5px; }}
+        }
+        #loading-text { font-size: 24px; margin-bottom: 20px; }
+        #loading-progress { width: 300px; height: 20px; background: #333; border-radius: 10px; overflow: hidden; }
+        #loading-bar { width: 0%; height: 100%; background: linear-gradient(90deg, #4CAF50, #8BC34A); transition: width 0.3s; }
+        #loading-details { margin-top: 10px; font-size: 14px; color: #aaa; }
+        
+        #debug { position: absolute; bottom: 80px; left: 20px; background: rgba(0,0,0,0.8); padding: 10px; border-radius: 5px; font-size: 11px; font-family: monospace; z-index: 100; }
+        #data-info { background: rgba(0,100,200,0.2); padding: 8px; border-radius: 5px; margin-bottom: 10px; font-size: 11px; }
+        .control-group { background: rgba(255,255,255,0.05); padding: 10px; border-radius: 5px; margin: 10px 0; }
+        .control-group-title { font-weight: bold; margin-bottom: 8px; color: #4CAF50; font-size: 12px; display: flex; justify-content: space-between; align-items: center; }
+        .file-info { font-size: 10px; color: #aaa; margin-top: 5px; border-top: 1px solid #333; padding-top: 5px; }
         
         /* Palette info */
-        .palette-info {{
+        .palette-info {
             background: rgba(255,255,255,0.05);
             padding: 5px;
             border-radius: 3px;
             margin-top: 5px;
             font-size: 10px;
             color: #aaa;
-        }}
+        }
         
         /* Legend Styles */
-        #legend {{
+        #legend {
             position: absolute; bottom: 20px; right: 20px;
             background: rgba(0,0,0,0.8); padding: 15px;
             border-radius: 8px; z-index: 100;
             font-size: 12px;
             min-width: 150px;
-        }}
-        .legend-title {{ 
+        }
+        .legend-title { 
             font-weight: bold; margin-bottom: 8px; 
             border-bottom: 1px solid #555; padding-bottom: 5px;
             color: #ddd; text-align: center;
-        }}
-        .legend-item {{ display: flex; align-items: center; margin-bottom: 4px; }}
-        .legend-color {{ width: 14px; height: 14px; margin-right: 8px; border: 1px solid #555; border-radius: 2px; }}
-        .legend-label {{ color: #ccc; }}
+        }
+        .legend-item { display: flex; align-items: center; margin-bottom: 4px; }
+        .legend-color { width: 14px; height: 14px; margin-right: 8px; border: 1px solid #555; border-radius: 2px; }
+        .legend-label { color: #ccc; }
     </style>
 </head>
 <body>
     <div style="text-align: center; margin-bottom: 10px;">
-        <img src="/static/logo.jpeg" alt="GPR VR Viewer Logo" style="max-width: 350px; height: 70px; float:right">
+        <img src="/static/logo.jpeg" alt="GPR VR Viewer Logo" height="70" decoding="async" style="max-width: 350px; height: 70px; float:right">
     </div>
     
     <div id="container"></div>
@@ -645,16 +866,16 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
     <div id="loading">
         <div id="loading-text">Loading GPR Data...</div>
         <div id="loading-progress"><div id="loading-bar"></div></div>
-        <div id="loading-details">Preparing {data_info['total_points']:,} points + surfaces...</div>
+        <div id="loading-details">Preparing $total_points points + surfaces...</div>
     </div>
     
     <div id="info">
         <h3 style="margin-top: 0;">GPR VR Explorer</h3>
         
         <div id="data-info">
-            <strong>File:</strong> {data_info['original_filename']}<br>
-            <strong>Dimensions:</strong> {x_len:.2f}m x {y_len:.2f}m x {z_len:.2f}m<br>
-            <strong>Color Palette:</strong> {settings['color_palette']}<br>
+            <strong>File:</strong> $original_filename<br>
+            <strong>Dimensions:</strong> ${x_dim}m x ${y_dim}m x ${z_dim}m<br>
+            <strong>Color Palette:</strong> $color_palette<br>
         </div>
         
         <div class="control-group">
@@ -671,13 +892,13 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
             </div>
             
             <div class="slider-container">
-                <div class="slider-label"><span>Point Size:</span><span id="sizeValue">{settings['vr_point_size']}</span></div>
-                <input type="range" id="sizeSlider" min="0.002" max="0.05" step="0.002" value="{settings['vr_point_size']}">
+                <div class="slider-label"><span>Point Size:</span><span id="sizeValue">$point_size</span></div>
+                <input type="range" id="sizeSlider" min="0.002" max="0.05" step="0.002" value="$point_size">
             </div>
             
             <!-- REPLACED SLIDER WITH CHECKLIST -->
             <div id="layer-list">
-                {layer_info}
+                $layer_info
             </div>
         </div>
         
@@ -688,12 +909,12 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
                 <label for="showSurface">Show Amplitude Surface</label>
             </div>
             <div class="slider-container">
-                <div class="slider-label"><span>Surface Opacity:</span><span id="surfaceOpacityValue">{settings['surface_opacity']}</span></div>
-                <input type="range" id="surfaceOpacitySlider" min="0.1" max="1" step="0.1" value="{settings['surface_opacity']}">
+                <div class="slider-label"><span>Surface Opacity:</span><span id="surfaceOpacityValue">$surface_opacity</span></div>
+                <input type="range" id="surfaceOpacitySlider" min="0.1" max="1" step="0.1" value="$surface_opacity">
             </div>
             <div class="toggle-container">
                 <input type="checkbox" id="showSlices">
-                <label for="showSlices">Show Depth Slices ({num_slices})</label>
+                <label for="showSlices">Show Depth Slices ($num_slices)</label>
             </div>
             <div class="slider-container">
                 <div class="slider-label"><span>Slice Opacity:</span><span id="sliceOpacityValue">0.5</span></div>
@@ -715,18 +936,14 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
                 <input type="checkbox" id="showAxes" checked>
                 <label for="showAxes">Show Data Axes</label>
             </div>
-            <div class="toggle-container">
-                <input type="checkbox" id="showAxes" checked>
-                <label for="showAxes">Show Data Axes</label>
-            </div>
             <div class="toggle-container">
                 <button onclick="resetPosition()">Reset Position to Floor</button>
             </div>
-            <div class="toggle-container" id="pipeToggleContainer" style="display: {'block' if pipe_file else 'none'}; margin-top:10px; border-top:1px solid #555; padding-top:10px;">
+            <div class="toggle-container" id="pipeToggleContainer" style="display: $pipe_display; margin-top:10px; border-top:1px solid #555; padding-top:10px;">
                 <input type="checkbox" id="show3DPipe">
                 <label for="show3DPipe">Show 3D Pipe Model</label>
             </div>
-            <div class="slider-container" id="pipeScaleContainer" style="display: {'block' if pipe_file else 'none'};">
+            <div class="slider-container" id="pipeScaleContainer" style="display: $pipe_display;">
                 <div class="slider-label"><span>Pipe Scale:</span><span id="pipeScaleValue">1.0</span></div>
                 <input type="range" id="pipeScaleSlider" min="0.1" max="10" step="0.1" value="1.0">
                 
@@ -752,8 +969,8 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
         </div>
         
         <div class="file-info">
-            Processed on: {data_info['processing_date']}<br>
-            Color Palette: {settings['color_palette']}<br>
+            Processed on: $processing_date<br>
+            Color Palette: $color_palette<br>
             <a href="/" style="color: #4CAF50;">← Process another file</a>
         </div>
     </div>
@@ -762,20 +979,21 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
     
     <div id="legend">
         <div class="legend-title">Amplitude (Signal Strength)</div>
-        {legend_info}
+        $legend_info
     </div>
     
     <button id="vr-button" disabled>Loading...</button>
 
     <script type="module">
         import * as THREE from 'three';
-        import {{ OrbitControls }} from 'three/addons/controls/OrbitControls.js';
-        import {{ XRControllerModelFactory }} from 'three/addons/webxr/XRControllerModelFactory.js';
-        import {{ PLYLoader }} from 'three/addons/loaders/PLYLoader.js';
-        import {{ OBJLoader }} from 'three/addons/loaders/OBJLoader.js';
+        import { OrbitControls } from 'three/addons/controls/OrbitControls.js';
+        import { XRControllerModelFactory } from 'three/addons/webxr/XRControllerModelFactory.js';
+        import { PLYLoader } from 'three/addons/loaders/PLYLoader.js';
+        import { GLTFLoader } from 'three/addons/loaders/GLTFLoader.js';
+        import { CSS2DRenderer, CSS2DObject } from 'three/addons/renderers/CSS2DRenderer.js';
 
         // ... (Keep existing Compass drawing function) ...
-        function drawCompassOnContext(ctx, angle, size) {{
+        function drawCompassOnContext(ctx, angle, size) {
             const cx = size/2, cy = size/2, r = size * 0.42;
             ctx.clearRect(0, 0, size, size);
             ctx.save();
@@ -791,10 +1009,10 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
             ctx.fillStyle = 'white'; ctx.font = 'bold ' + (size * 0.2) + 'px Arial';
             ctx.textAlign = 'center'; ctx.textBaseline = 'middle'; ctx.shadowColor="black"; ctx.shadowBlur=4; ctx.fillText('N', 0, -5);
             ctx.restore();
-            ctx.beginPath(); ctx.arc(0, 0, size * 0.05, 0, Math.PI * 2); ctx.fillStyle = '#GOLD'; ctx.fill();
+            ctx.beginPath(); ctx.arc(0, 0, size * 0.05, 0, Math.PI * 2); ctx.fillStyle = 'gold'; ctx.fill();
             ctx.restore();
             ctx.save(); ctx.translate(cx, cy); ctx.strokeStyle = "rgba(255,255,255,0.3)"; ctx.lineWidth = 1; ctx.beginPath(); ctx.moveTo(0, -r); ctx.lineTo(0, -r-5); ctx.stroke(); ctx.restore();
-        }}
+        }
 
         const compassCanvas = document.getElementById('compassCanvas');
         const compassCtx = compassCanvas.getContext('2d');
@@ -804,11 +1022,11 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
         const loadingBar = document.getElementById('loading-bar');
         const loadingDetails = document.getElementById('loading-details');
         
-        function debug(msg) {{ debugEl.textContent = msg; console.log(msg); }}
-        function updateLoadingProgress(pct, txt) {{
+        function debug(msg) { debugEl.textContent = msg; console.log(msg); }
+        function updateLoadingProgress(pct, txt) {
             loadingBar.style.width = pct + '%';
             if (txt) loadingDetails.textContent = txt;
-        }}
+        }
 
         // Scene
         const scene = new THREE.Scene();
@@ -817,18 +1035,53 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
         const camera = new THREE.PerspectiveCamera(75, window.innerWidth / window.innerHeight, 0.01, 1000);
         camera.position.set(0, 1.7, 2);
         
-        const renderer = new THREE.WebGLRenderer({{ antialias: true }});
-        renderer.setPixelRatio(Math.min(window.devicePixelRatio, 2));
+        // Ask for the discrete GPU on dual-GPU machines. WebGPURenderer is not used: in this three
+        // release it has no WebXR path and does not run the points' custom ShaderMaterial
+        const renderer = new THREE.WebGLRenderer({ antialias: true, powerPreference: 'high-performance' });
+        // Point quads are fragment-bound: cap the desktop pixel ratio at 1.5 (lowered further
+        // by adaptResolution when frames run slow) and render VR at 0.8x the default framebuffer
+        let maxPixelRatio = Math.min(window.devicePixelRatio, 1.5);
+        let pixelRatio = maxPixelRatio;
+        renderer.setPixelRatio(pixelRatio);
         renderer.setSize(window.innerWidth, window.innerHeight);
         renderer.xr.enabled = true;
+        renderer.xr.setFramebufferScaleFactor(0.8);  // three can't change this mid-session
         renderer.shadowMap.enabled = true;
         document.getElementById('container').appendChild(renderer.domElement);
         
+        // HTML overlay for axis labels on desktop (no texture uploads); VR uses the sprites
+        const labelRenderer = new CSS2DRenderer();
+        labelRenderer.setSize(window.innerWidth, window.innerHeight);
+        labelRenderer.domElement.style.position = 'absolute';
+        labelRenderer.domElement.style.top = '0';
+        labelRenderer.domElement.style.pointerEvents = 'none';
+        document.getElementById('container').appendChild(labelRenderer.domElement);
+        
         const controls = new OrbitControls(camera, renderer.domElement);
         controls.enableDamping = true;
         controls.target.set(0, 0, 0);
         controls.maxPolarAngle = Math.PI; 
         
+        // Desktop frames are only rendered when something changed: camera moves, UI input,
+        // finished loads and resizes raise the flag. VR sessions render every frame.
+        let needsRender = true;
+        function requestRender() { needsRender = true; }
+        controls.addEventListener('change', requestRender);
+        ['input', 'change', 'click'].forEach(type => document.addEventListener(type, requestRender, { capture: true, passive: true }));
+        
+        // Coalesce repeated UI-driven work into one call per animation frame. Drained from
+        // the render loop: window.requestAnimationFrame does not fire during a VR session
+        const scheduled = new Set();
+        function schedule(fn) {
+            scheduled.add(fn);
+        }
+        function runScheduled() {
+            if (scheduled.size === 0) return;
+            const pending = [...scheduled];
+            scheduled.clear();
+            pending.forEach(fn => fn());
+        }
+        
         // Lighting
         const ambientLight = new THREE.AmbientLight(0xffffff, 0.5);
         scene.add(ambientLight);
@@ -844,22 +1097,24 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
 
         texLoader.load(
             '/static/ground.jpg',
-            function (texture) {{
+            function (texture) {
                 // compute a ground size from data extents (use larger of x/y and add margin)
-                const groundSize = {round(max(x_len, y_len) * 1.5, 3)};
+                const groundSize = $ground_size;
                 const geometry = new THREE.PlaneGeometry(groundSize, groundSize);
-                const material = new THREE.MeshBasicMaterial({{ map: texture, side: THREE.DoubleSide, color: 0xffffff }});
+                const material = new THREE.MeshBasicMaterial({ map: texture, side: THREE.DoubleSide, color: 0xffffff });
                 const plane = new THREE.Mesh(geometry, material);
                 plane.rotation.x = -Math.PI / 2;
                 plane.position.y = -0.05;
                 groundGroup.add(plane);
                 groundGroup.visible = false; // Hidden by default
-            }},
+                requestRender();
+            },
             undefined,
-            function (err) {{
+            function (err) {
                 const grid = new THREE.GridHelper(50, 50, 0x666666, 0x444444);
                 groundGroup.add(grid);
-            }}
+                requestRender();
+            }
         );
         
         // --- DATA CONTAINER ---
@@ -869,20 +1124,20 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
         mainGroup.rotation.x = -Math.PI / 2;
         mainGroup.scale.setScalar(0.1); // Initial Zoom 0.1
         
-        const initialTransform = {{
+        const initialTransform = {
             position: mainGroup.position.clone(),
             rotation: mainGroup.rotation.clone(),
             scale: mainGroup.scale.clone()
-        }};
+        };
         
-        window.resetPosition = function() {{
+        window.resetPosition = function() {
             mainGroup.position.copy(initialTransform.position);
             mainGroup.rotation.copy(initialTransform.rotation);
             mainGroup.scale.copy(initialTransform.scale);
             document.getElementById('scaleSlider').value = 0.1;
             document.getElementById('scaleValue').textContent = "0.1";
             controls.reset();
-        }};
+        };
         
         const pointCloudGroup = new THREE.Group();
         mainGroup.add(pointCloudGroup);
@@ -896,262 +1151,391 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
         mainGroup.add(axesGroup);
         
         // Settings
-        // Initialize layers array - This needs to match the indices in the Python loop
-        // Settings
-        const layers = []; // Initialize as empty, loaders will fill specific indices 
         const surfaces = [];
         const slices = [];
-        let pointSize = {settings['vr_point_size']};
-        let surfaceOpacity = {settings['surface_opacity']};
+        let pointSize = $point_size;
+        let surfaceOpacity = $surface_opacity;
         let sliceOpacity = 0.5;
+        
+        // One material per kind, shared by every surface / slice mesh; sliders set it once
+        const surfaceMaterial = new THREE.MeshStandardMaterial({
+            vertexColors: true, side: THREE.DoubleSide, transparent: true,
+            opacity: surfaceOpacity, metalness: 0.1, roughness: 0.8
+        });
+        const sliceMaterial = new THREE.MeshStandardMaterial({
+            vertexColors: true, side: THREE.DoubleSide, transparent: true,
+            opacity: sliceOpacity, metalness: 0.1, roughness: 0.8
+        });
+
+        // VR label sprites share one canvas atlas (a single texture upload). Each sprite samples
+        // its 512x256 cell through a texture clone with its own offset/repeat.
+        const LABEL_CELL_W = 512, LABEL_CELL_H = 256, LABEL_COLS = 2, LABEL_ROWS = 5;  // room for 10 labels
+        const labelAtlas = document.createElement('canvas');
+        labelAtlas.width = LABEL_CELL_W * LABEL_COLS; labelAtlas.height = LABEL_CELL_H * LABEL_ROWS;
+        const labelAtlasCtx = labelAtlas.getContext('2d');
+        const labelAtlasTexture = new THREE.CanvasTexture(labelAtlas);
+        labelAtlasTexture.minFilter = THREE.LinearFilter;  // no mipmaps, so cells can't bleed together
+        labelAtlasTexture.generateMipmaps = false;
+        let labelCount = 0;
+        const axisLabels = [];  // { sprite, htmlLabel } per label
 
-        // ... (Keep existing Axis Generator) ...
-        function createTextSprite(text, color, size=40) {{
-            const canvas = document.createElement('canvas');
-            const ctx = canvas.getContext('2d');
-            // Increased canvas size to prevent Clipping
-            canvas.width = 512; canvas.height = 256;
+        function createTextLabel(text, color, size=40) {
+            const col = labelCount % LABEL_COLS, row = Math.floor(labelCount / LABEL_COLS);
+            labelCount++;
+            
+            const ctx = labelAtlasCtx;
+            ctx.save();
+            ctx.translate(col * LABEL_CELL_W, row * LABEL_CELL_H);
+            ctx.beginPath(); ctx.rect(0, 0, LABEL_CELL_W, LABEL_CELL_H); ctx.clip();
             ctx.fillStyle = color; 
             
             // User settings
-            const fontSize = size * {settings.get('font_size_multiplier', 1.0)};
-            const fontFamily = "{settings.get('font_family', 'Arial')}";
+            const fontSize = size * $font_size_multiplier;
+            const fontFamily = "$font_family";
             
             // Scale font size generally for the larger canvas
             ctx.font = "Bold " + (fontSize * 2) + "px " + fontFamily; 
             ctx.textAlign = "center"; 
             ctx.textBaseline = "middle"; 
             ctx.fillText(text, 256, 128);
+            ctx.restore();
+            labelAtlasTexture.needsUpdate = true;
             
-            const texture = new THREE.CanvasTexture(canvas);
-            const material = new THREE.SpriteMaterial({{ map: texture, depthTest: false }});
+            // Clones share the atlas image; canvas rows run top-down, texture v runs bottom-up
+            const texture = labelAtlasTexture.clone();
+            texture.repeat.set(1 / LABEL_COLS, 1 / LABEL_ROWS);
+            texture.offset.set(col / LABEL_COLS, 1 - (row + 1) / LABEL_ROWS);
+            const material = new THREE.SpriteMaterial({ map: texture, depthTest: false });
             const sprite = new THREE.Sprite(material);
             // Scale remains similar to world space size from before
             sprite.scale.set(1, 0.5, 1);
-            return sprite;
-        }}
+            
+            const div = document.createElement('div');
+            div.textContent = text;
+            div.style.cssText = 'color:' + color + ';font:bold ' + Math.round(fontSize * 0.4) + 'px ' + fontFamily +
+                                ';text-shadow:0 0 3px #000;white-space:nowrap;';
+            const htmlLabel = new CSS2DObject(div);
+            
+            const label = new THREE.Group();
+            label.add(sprite, htmlLabel);
+            axisLabels.push({ sprite, htmlLabel });
+            return label;
+        }
+        
+        // Sprites only while presenting in VR, HTML labels otherwise (and only with the axes shown)
+        function updateLabelMode() {
+            const presenting = renderer.xr.isPresenting;
+            axisLabels.forEach(({ sprite, htmlLabel }) => {
+                sprite.visible = presenting;
+                htmlLabel.visible = !presenting && axesGroup.visible;
+            });
+        }
 
-        function buildDataAxes() {{
-            const xLen = {x_len}, yLen = {y_len}, zLen = {z_len};
+        function buildDataAxes() {
+            const xLen = $x_len, yLen = $y_len, zLen = $z_len;
             // Data Coordinates (inside mainGroup): X=East/West, Y=North/South, Z=Depth
             const xMin = -xLen / 2, yMin = -yLen / 2, zMin = -zLen / 2;
             const xMax = xLen / 2, yMax = yLen / 2, zMax = zLen / 2;
 
-            // --- 1. RESTORE ORIGINAL AXES (Red/Green/Blue Lines) ---
-            // X Axis (Red)
-            const xMat = new THREE.LineBasicMaterial({{ color: 0xff0000, linewidth: 2 }});
-            const xPoints = [new THREE.Vector3(xMin, yMin, zMin), new THREE.Vector3(xMax, yMin, zMin)];
-            axesGroup.add(new THREE.Line(new THREE.BufferGeometry().setFromPoints(xPoints), xMat));
+            // --- 1. AXES (Red/Green/Blue) + SURVEY BOX (Wireframe) ---
+            // One LineSegments / draw call; RGBA vertex colors keep the axes opaque and the box at 0.3
+            const linePositions = [
+                xMin, yMin, zMin,  xMax, yMin, zMin,   // X Axis
+                xMin, yMin, zMin,  xMin, yMax, zMin,   // Y Axis
+                xMin, yMin, zMin,  xMin, yMin, zMax    // Z Axis
+            ];
+            const lineColors = [];
+            const pushSegmentColor = (hex, alpha) => {
+                const c = new THREE.Color(hex);
+                lineColors.push(c.r, c.g, c.b, alpha, c.r, c.g, c.b, alpha);
+            };
+            pushSegmentColor(0xff0000, 1); pushSegmentColor(0x00ff00, 1); pushSegmentColor(0x0088ff, 1);
             
-            // Y Axis (Green)
-            const yMat = new THREE.LineBasicMaterial({{ color: 0x00ff00, linewidth: 2 }});
-            const yPoints = [new THREE.Vector3(xMin, yMin, zMin), new THREE.Vector3(xMin, yMax, zMin)];
-            axesGroup.add(new THREE.Line(new THREE.BufferGeometry().setFromPoints(yPoints), yMat));
+            // Survey box: 12 edges as vertex pairs, precomputed when the page was generated
+            const boxEdges = $box_edges;
+            linePositions.push(...boxEdges);
+            for (let e = 0; e < boxEdges.length / 6; e++) pushSegmentColor(0xffff00, 0.3);
             
-            // Z Axis (Blue)
-            const zMat = new THREE.LineBasicMaterial({{ color: 0x0088ff, linewidth: 2 }});
-            const zPoints = [new THREE.Vector3(xMin, yMin, zMin), new THREE.Vector3(xMin, yMin, zMax)];
-            axesGroup.add(new THREE.Line(new THREE.BufferGeometry().setFromPoints(zPoints), zMat));
+            const lineGeo = new THREE.BufferGeometry();
+            lineGeo.setAttribute('position', new THREE.Float32BufferAttribute(linePositions, 3));
+            lineGeo.setAttribute('color', new THREE.Float32BufferAttribute(lineColors, 4));
+            axesGroup.add(new THREE.LineSegments(lineGeo, new THREE.LineBasicMaterial({ vertexColors: true, transparent: true })));
 
             // --- 2. RESTORE DIMENSION LABELS ---
-            const xLabel = createTextSprite("X: " + xLen.toFixed(1) + "m", "#ff5555", 35); 
+            const xLabel = createTextLabel("X: " + xLen.toFixed(1) + "m", "#ff5555", 35); 
             xLabel.position.set(0, yMin - 0.2, zMin); 
             axesGroup.add(xLabel);
             
-            const yLabel = createTextSprite("Y: " + yLen.toFixed(1) + "m", "#55ff55", 35); 
+            const yLabel = createTextLabel("Y: " + yLen.toFixed(1) + "m", "#55ff55", 35); 
             yLabel.position.set(xMin - 0.3, 0, zMin); 
             axesGroup.add(yLabel);
 
-            const zLabel = createTextSprite("Z: " + zLen.toFixed(1) + "m", "#5555ff", 35); 
+            const zLabel = createTextLabel("Z: " + zLen.toFixed(1) + "m", "#5555ff", 35); 
             zLabel.position.set(xMin, yMin - 0.2, 0); 
             axesGroup.add(zLabel);
 
-            // --- 3. SURVEY BOX (Wireframe) ---
-            const boxGeo = new THREE.BoxGeometry(xLen, yLen, zLen);
-            const boxEdges = new THREE.EdgesGeometry(boxGeo);
-            const boxLine = new THREE.LineSegments(boxEdges, new THREE.LineBasicMaterial({{ color: 0xffff00, opacity: 0.3, transparent: true }}));
-            axesGroup.add(boxLine);
-            
-            // --- 4. NEW DIRECTION LABELS ---
+            // --- 3. NEW DIRECTION LABELS ---
             // X Axis Directions
-            const lblWest = createTextSprite("← West", "#cccccc", 30);
+            const lblWest = createTextLabel("← West", "#cccccc", 30);
             lblWest.position.set(xMin - 0.5, 0, 0); 
             axesGroup.add(lblWest);
             
-            const lblEast = createTextSprite("East →", "#cccccc", 30);
+            const lblEast = createTextLabel("East →", "#cccccc", 30);
             lblEast.position.set(xMax + 0.5, 0, 0); 
             axesGroup.add(lblEast);
             
             // Y Axis Directions (North/South)
-            const lblNorth = createTextSprite("↑ North", "#cccccc", 30);
+            const lblNorth = createTextLabel("↑ North", "#cccccc", 30);
             lblNorth.position.set(0, yMax + 0.5, 0); 
             axesGroup.add(lblNorth);
             
-            const lblSouth = createTextSprite("↓ South", "#cccccc", 30);
+            const lblSouth = createTextLabel("↓ South", "#cccccc", 30);
             lblSouth.position.set(0, yMin - 0.5, 0); 
             axesGroup.add(lblSouth);
             
             // Z Axis Directions (Depth)
             // zMax is Surface (approx 0), zMin is Deep (approx -5)
-            const lblSurf = createTextSprite("Surface", "#ccffcc", 30);
+            const lblSurf = createTextLabel("Surface", "#ccffcc", 30);
             lblSurf.position.set(0, 0, zMax + 0.2);
             axesGroup.add(lblSurf);
             
-            const lblDepth = createTextSprite("Depth", "#ccffcc", 30);
+            const lblDepth = createTextLabel("Depth", "#ccffcc", 30);
             lblDepth.position.set(0, 0, zMin - 0.2);
             axesGroup.add(lblDepth);
-        }}
+        }
         buildDataAxes();
+        updateLabelMode();
+        renderer.xr.addEventListener('sessionstart', updateLabelMode);
+        renderer.xr.addEventListener('sessionend', updateLabelMode);
 
         // VR HUD
         const vrHudCanvas = document.createElement('canvas');
         vrHudCanvas.width = 256; vrHudCanvas.height = 256;
         const vrHudCtx = vrHudCanvas.getContext('2d');
         const vrHudTexture = new THREE.CanvasTexture(vrHudCanvas);
-        const vrHudMaterial = new THREE.SpriteMaterial({{ map: vrHudTexture, depthTest: false, depthWrite: false }});
+        const vrHudMaterial = new THREE.SpriteMaterial({ map: vrHudTexture, depthTest: false, depthWrite: false });
         const vrHudSprite = new THREE.Sprite(vrHudMaterial);
         vrHudSprite.position.set(0.15, 0.15, -0.5); vrHudSprite.scale.set(0.15, 0.15, 1);
 
         // Loaders
-        const plyLoader = new PLYLoader();
-        const objLoader = new OBJLoader();
+        const gltfLoader = new GLTFLoader();
         let loadedCount = 0;
-        const totalFiles = {total_files};
-        const layerPromises = [];
-        
-        {layer_loaders_js}
+        const totalFiles = $total_files;
+        
+        // All layers share one instanced quad mesh (a single draw call). points.bin holds
+        // 8 bytes per point: a uint32 block of 10:10:10 quantized positions, then r, g, b, layer bytes.
+        const POINT_VERTEX_SHADER = [
+            'attribute uint pointPacked;',
+            'attribute vec4 pointColor;',
+            'uniform vec3 positionMin;',
+            'uniform vec3 positionScale;',
+            'uniform float pointSize;',
+            'uniform float layerVisible[LAYER_COUNT];',
+            'varying vec3 vColor;',
+            'void main() {',
+            '    vColor = pointColor.rgb;',
+            '    if (layerVisible[int(pointColor.a * 255.0 + 0.5)] < 0.5) {',
+            '        gl_Position = vec4(2.0, 2.0, 2.0, 1.0);  // outside the clip volume',
+            '        return;',
+            '    }',
+            '    vec3 pointPosition = vec3(float(pointPacked & 1023u), float((pointPacked >> 10) & 1023u),',
+            '                              float((pointPacked >> 20) & 1023u)) * positionScale + positionMin;',
+            '    vec4 mvPosition = modelViewMatrix * vec4(pointPosition, 1.0);',
+            '    // Camera-facing quad sized like a size-attenuated PointsMaterial point',
+            '    mvPosition.xy += position.xy * pointSize / projectionMatrix[1][1];',
+            '    gl_Position = projectionMatrix * mvPosition;',
+            '}'
+        ].join('\\n');
+        const POINT_FRAGMENT_SHADER = [
+            'varying vec3 vColor;',
+            'void main() { gl_FragColor = vec4(vColor, 1.0); }'
+        ].join('\\n');
+        
+        const layerRanges = [];   // { start, count } per layer index
+        const layerVisible = [];  // 1 = shown; uploaded as the shader's layer mask
+        let pointCloud = null;
+        
+        function buildPointCloud(manifest, buffer) {
+            const count = manifest.count;
+            manifest.layers.forEach(layer => {
+                layerRanges[layer.index] = { start: layer.start, count: layer.count };
+            });
+            for (let i = 0; i < layerRanges.length; i++) layerVisible[i] = 1;
+            
+            const quad = new THREE.PlaneGeometry(1, 1);
+            const geometry = new THREE.InstancedBufferGeometry();
+            geometry.setIndex(quad.getIndex());
+            geometry.setAttribute('position', quad.getAttribute('position'));
+            // Uint32 data is bound as an integer attribute; colors + layer are normalized bytes
+            geometry.setAttribute('pointPacked', new THREE.InstancedBufferAttribute(new Uint32Array(buffer, 0, count), 1));
+            geometry.setAttribute('pointColor', new THREE.InstancedBufferAttribute(new Uint8Array(buffer, count * 4, count * 4), 4, true));
+            geometry.instanceCount = count;
+            
+            const material = new THREE.ShaderMaterial({
+                defines: { LAYER_COUNT: layerRanges.length },
+                uniforms: {
+                    positionMin: { value: new THREE.Vector3().fromArray(manifest.position_min) },
+                    positionScale: { value: new THREE.Vector3().fromArray(manifest.position_scale) },
+                    pointSize: { value: pointSize },
+                    layerVisible: { value: layerVisible }
+                },
+                vertexShader: POINT_VERTEX_SHADER,
+                fragmentShader: POINT_FRAGMENT_SHADER
+            });
+            
+            pointCloud = new THREE.Mesh(geometry, material);
+            pointCloud.frustumCulled = false;  // bounds would come from the unit quad
+            pointCloudGroup.add(pointCloud);
+            requestRender();
+        }
         
-        // MODIFIED LAYER LOADING LOGIC
-        // We need to make sure 'layers' array is populated correctly at specific indices
-        // The original loader pushed to array, here we ensure index assignment in the generated JS
-        // (Note: The Python generate_layer_loaders function should be fine, it adds to pointCloudGroup)
-        // But for the checklist to work, we need to map the loaded object to the layers array
+        // Draw instances only up to the end of the last visible layer; the shader
+        // masks any hidden layers before it
+        function updateLayerVisibility() {
+            if (!pointCloud) return;
+            let end = 0;
+            layerRanges.forEach((range, i) => {
+                if (range && layerVisible[i]) end = range.start + range.count;
+            });
+            pointCloud.geometry.instanceCount = end;
+            requestRender();
+        }
         
-        // Overwriting the array push in generated code logic:
-        // The generated code does: layers.push(points); 
-        // We will just let it push, but we know the order matches the file order.
+        // Manifest and point buffer are requested together so the download overlaps the manifest round trip
+        const layersReady = Promise.all([
+            fetch('/files/$job_id/layers.json', { priority: 'high' }).then(r => r.json()),
+            fetch('/files/$job_id/points.bin', { priority: 'high' }).then(r => r.arrayBuffer())
+        ])
+            .then(([manifest, buffer]) => {
+                if (manifest.count > 0 && manifest.layers.length > 0) buildPointCloud(manifest, buffer);
+                loadedCount++;
+                updateLoadingProgress((loadedCount / totalFiles) * 100, 'Loaded ' + manifest.count.toLocaleString() + ' points');
+            })
+            .catch(err => console.error('Error loading point cloud:', err));
         
-        {surface_loader_js}
-        {slice_loader_js}
-        {pipe_loader_js}
+        $surface_loader_js
+        $slice_loader_js
+        $pipe_loader_js
         
-        Promise.all(layerPromises).then(() => {{
+        layersReady.then(() => {
             document.getElementById('loading').style.display = 'none';
             debug('Ready');
-        }});
+        });
 
         // --- NEW CHECKLIST LOGIC ---
-        window.toggleLayer = function(index, isChecked) {{
-            if (layers[index]) {{
-                layers[index].visible = isChecked;
-            }} else {{
+        window.toggleLayer = function(index, isChecked) {
+            if (layerRanges[index]) {
+                layerVisible[index] = isChecked ? 1 : 0;
+                schedule(updateLayerVisibility);
+            } else {
                 console.warn("Layer " + index + " not ready yet");
-            }}
-        }};
-
-        window.toggleAllLayers = function(visible) {{
-            for(let i=0; i < {len(ply_files)}; i++) {{
-                if (layers[i]) {{
-                    layers[i].visible = visible;
-                }}
+            }
+        };
+
+        window.toggleAllLayers = function(visible) {
+            for(let i=0; i < $num_layers; i++) {
+                if (layerRanges[i]) {
+                    layerVisible[i] = visible ? 1 : 0;
+                }
                 
                 const cb = document.getElementById('layer_cb_' + i);
                 if(cb) cb.checked = visible;
-            }}
+            }
+            schedule(updateLayerVisibility);
             
             // Update Toggle Master Checkbox State
             const master = document.getElementById('showPoints');
             if(master) master.checked = visible;
-        }};
+        };
 
         // Slider Listeners
-        document.getElementById('sizeSlider').addEventListener('input', (e) => {{
+        document.getElementById('sizeSlider').addEventListener('input', (e) => {
             pointSize = parseFloat(e.target.value);
             document.getElementById('sizeValue').textContent = pointSize.toFixed(3);
-            layers.forEach(l => l.material.size = pointSize);
-        }});
-        document.getElementById('scaleSlider').addEventListener('input', (e) => {{
+            if (pointCloud) pointCloud.material.uniforms.pointSize.value = pointSize;
+        }, { passive: true });
+        document.getElementById('scaleSlider').addEventListener('input', (e) => {
             const val = parseFloat(e.target.value);
             document.getElementById('scaleValue').textContent = val.toFixed(1);
             mainGroup.scale.setScalar(val);
-        }});
+        }, { passive: true });
         document.getElementById('showPoints').addEventListener('change', (e) => pointCloudGroup.visible = e.target.checked);
         document.getElementById('showGround').addEventListener('change', (e) => groundGroup.visible = e.target.checked);
-        document.getElementById('showAxes').addEventListener('change', (e) => axesGroup.visible = e.target.checked);
-        document.getElementById('surfaceOpacitySlider').addEventListener('input', (e) => {{
+        document.getElementById('showAxes').addEventListener('change', (e) => { axesGroup.visible = e.target.checked; updateLabelMode(); });
+        document.getElementById('surfaceOpacitySlider').addEventListener('input', (e) => {
             surfaceOpacity = parseFloat(e.target.value);
             document.getElementById('surfaceOpacityValue').textContent = surfaceOpacity;
-            surfaces.forEach(s => s.material.opacity = surfaceOpacity);
-        }});
-        document.getElementById('sliceOpacitySlider').addEventListener('input', (e) => {{
+            surfaceMaterial.opacity = surfaceOpacity;
+        }, { passive: true });
+        document.getElementById('sliceOpacitySlider').addEventListener('input', (e) => {
             sliceOpacity = parseFloat(e.target.value);
             document.getElementById('sliceOpacityValue').textContent = sliceOpacity;
-            slices.forEach(s => s.material.opacity = sliceOpacity);
-        }});
+            sliceMaterial.opacity = sliceOpacity;
+        }, { passive: true });
         document.getElementById('showSurface').addEventListener('change', (e) => surfaceGroup.visible = e.target.checked);
         document.getElementById('showSlices').addEventListener('change', (e) => sliceGroup.visible = e.target.checked);
         
         // Pipe Scale Slider
         const pipeScaleSlider = document.getElementById('pipeScaleSlider');
-        if (pipeScaleSlider) {{
-            pipeScaleSlider.addEventListener('input', (e) => {{
+        if (pipeScaleSlider) {
+            pipeScaleSlider.addEventListener('input', (e) => {
                 const val = parseFloat(e.target.value);
                 document.getElementById('pipeScaleValue').textContent = val.toFixed(1);
-                if (typeof pipeGroup !== 'undefined') {{
+                if (typeof pipeGroup !== 'undefined') {
                     pipeGroup.scale.setScalar(val);
-                }}
-            }});
-        }}
+                }
+            }, { passive: true });
+        }
         
         // Pipe Position X
         const pipePosXSlider = document.getElementById('pipePosXSlider');
-        if (pipePosXSlider) {{
-            pipePosXSlider.addEventListener('input', (e) => {{
+        if (pipePosXSlider) {
+            pipePosXSlider.addEventListener('input', (e) => {
                 const val = parseFloat(e.target.value);
                 document.getElementById('pipePosXValue').textContent = val.toFixed(1);
                 if (typeof pipeGroup !== 'undefined') pipeGroup.position.x = val;
-            }});
-        }}
+            }, { passive: true });
+        }
         
         // Pipe Position Y
         const pipePosYSlider = document.getElementById('pipePosYSlider');
-        if (pipePosYSlider) {{
-            pipePosYSlider.addEventListener('input', (e) => {{
+        if (pipePosYSlider) {
+            pipePosYSlider.addEventListener('input', (e) => {
                 const val = parseFloat(e.target.value);
                 document.getElementById('pipePosYSliderValue').textContent = val.toFixed(1);
                 if (typeof pipeGroup !== 'undefined') pipeGroup.position.y = val;
-            }});
-        }}
+            }, { passive: true });
+        }
         
         // Pipe Position Z
         const pipePosZSlider = document.getElementById('pipePosZSlider');
-        if (pipePosZSlider) {{
-            pipePosZSlider.addEventListener('input', (e) => {{
+        if (pipePosZSlider) {
+            pipePosZSlider.addEventListener('input', (e) => {
                 const val = parseFloat(e.target.value);
                 document.getElementById('pipePosZSliderValue').textContent = val.toFixed(1);
                 if (typeof pipeGroup !== 'undefined') pipeGroup.position.z = val;
-            }});
-        }}
+            }, { passive: true });
+        }
         
         // Pipe Rotation Z (Heading in this coord system)
         const pipeRotZSlider = document.getElementById('pipeRotZSlider');
-        if (pipeRotZSlider) {{
-            pipeRotZSlider.addEventListener('input', (e) => {{
+        if (pipeRotZSlider) {
+            pipeRotZSlider.addEventListener('input', (e) => {
                 const val = parseFloat(e.target.value);
                 document.getElementById('pipeRotZSliderValue').textContent = val.toFixed(0);
                 if (typeof pipeGroup !== 'undefined') pipeGroup.rotation.z = val * Math.PI / 180;
-            }});
-        }}
+            }, { passive: true });
+        }
         
         // Pipe Visibility Checkbox
         const pipeCheckbox = document.getElementById('show3DPipe');
-        if (pipeCheckbox) {{
-            pipeCheckbox.addEventListener('change', (e) => {{
-                if (typeof pipeGroup !== 'undefined') {{
+        if (pipeCheckbox) {
+            pipeCheckbox.addEventListener('change', (e) => {
+                if (typeof pipeGroup !== 'undefined') {
                     pipeGroup.visible = e.target.checked;
-                }}
-            }});
-        }}
+                }
+            });
+        }
 
         // VR Setup
         const controllerModelFactory = new XRControllerModelFactory();
@@ -1160,42 +1544,50 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
         const controller0 = renderer.xr.getController(0);
         const controller1 = renderer.xr.getController(1);
         cameraRig.add(controller0); cameraRig.add(controller1);
-        [controller0, controller1].forEach(c => {{
+        // Both controller rays share one geometry and one material
+        const rayGeometry = new THREE.BufferGeometry().setFromPoints([new THREE.Vector3(0,0,0), new THREE.Vector3(0,0,-1)]);
+        const rayMaterial = new THREE.LineBasicMaterial({ color: 0xffffff, transparent: true, opacity: 0.5 });
+        [controller0, controller1].forEach(c => {
             const grp = renderer.xr.getControllerGrip(c === controller0 ? 0 : 1);
             grp.add(controllerModelFactory.createControllerModel(grp));
             cameraRig.add(grp);
-            c.add(new THREE.Line(new THREE.BufferGeometry().setFromPoints([new THREE.Vector3(0,0,0), new THREE.Vector3(0,0,-1)]), new THREE.LineBasicMaterial({{ color: 0xffffff, transparent: true, opacity: 0.5 }})));
-        }});
+            c.add(new THREE.Line(rayGeometry, rayMaterial));
+        });
 
         // 6-DoF Interaction
         const grabbingControllers = new Set();
         const previousTransforms = new Map();
         
-        function onSqueezeStart(event) {{
+        // Scratch objects reused by the squeeze handlers and the render loop
+        const _tmpMat = new THREE.Matrix4(), _tmpInv = new THREE.Matrix4();
+        const _tmpScale = new THREE.Vector3(), _tmpDir = new THREE.Vector3();
+        
+        // One grab record per controller, refilled in place on every squeeze
+        const grabPool = new Map([controller0, controller1].map(c => [c, { relativeMatrix: new THREE.Matrix4(), startDistSq: 0, startScale: 1 }]));
+        
+        function beginGrab(controller, startDistSq) {
+            const data = grabPool.get(controller);
+            _tmpInv.copy(controller.matrixWorld).invert();
+            data.relativeMatrix.multiplyMatrices(_tmpInv, mainGroup.matrixWorld);
+            data.startDistSq = startDistSq;
+            data.startScale = mainGroup.scale.x;
+            previousTransforms.set(controller, data);
+        }
+        
+        function onSqueezeStart(event) {
             const controller = event.target;
             grabbingControllers.add(controller);
-            const controllerInv = controller.matrixWorld.clone().invert();
-            const relativeMatrix = new THREE.Matrix4().multiplyMatrices(controllerInv, mainGroup.matrixWorld);
-            previousTransforms.set(controller, {{
-                relativeMatrix: relativeMatrix,
-                startDist: grabbingControllers.size === 2 ? controller0.position.distanceTo(controller1.position) : 0,
-                startScale: mainGroup.scale.x
-            }});
-        }}
-        
-        function onSqueezeEnd(event) {{
+            beginGrab(controller, grabbingControllers.size === 2 ? controller0.position.distanceToSquared(controller1.position) : 0);
+        }
+        
+        function onSqueezeEnd(event) {
             const releasedController = event.target;
             grabbingControllers.delete(releasedController);
             previousTransforms.delete(releasedController);
-            if (grabbingControllers.size === 1) {{
-                const remainingController = grabbingControllers.values().next().value;
-                const controllerInv = remainingController.matrixWorld.clone().invert();
-                const relativeMatrix = new THREE.Matrix4().multiplyMatrices(controllerInv, mainGroup.matrixWorld);
-                previousTransforms.set(remainingController, {{
-                    relativeMatrix: relativeMatrix, startDist: 0, startScale: mainGroup.scale.x 
-                }});
-            }}
-        }}
+            if (grabbingControllers.size === 1) {
+                beginGrab(grabbingControllers.values().next().value, 0);
+            }
+        }
         
         controller0.addEventListener('squeezestart', onSqueezeStart);
         controller0.addEventListener('squeezeend', onSqueezeEnd);
@@ -1205,8 +1597,8 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
         // CHANGED VR INTERACTION: Cycle Layers (Left Trigger)
         let currentLayerIndex = -1; // -1: All, 0..N: Single, N+1: None
         
-        controller0.addEventListener('selectstart', () => {{
-            const layerCount = layers.length; // Max index + 1
+        controller0.addEventListener('selectstart', () => {
+            const layerCount = layerRanges.length; // Max index + 1
             if (layerCount === 0) return;
             
             currentLayerIndex++;
@@ -1214,112 +1606,285 @@ def create_vr_viewer(ply_files, layer_info, legend_info, output_dir, settings, d
             
             const masterCb = document.getElementById('showPoints');
             
-            if (currentLayerIndex === -1) {{
+            if (currentLayerIndex === -1) {
                 // SHOW ALL
                 pointCloudGroup.visible = true;
                 if(masterCb) masterCb.checked = true;
                 toggleAllLayers(true);
                 debug("Show All Layers");
-            }} else if (currentLayerIndex === layerCount) {{
+            } else if (currentLayerIndex === layerCount) {
                 // SHOW NONE
                 pointCloudGroup.visible = false;
                 if(masterCb) masterCb.checked = false;
                 debug("Hide All Layers");
-            }} else {{
+            } else {
                 // SHOW SINGLE
                 pointCloudGroup.visible = true;
                 if(masterCb) masterCb.checked = true;
                 
                 // Set only currentLayerIndex visible
-                layers.forEach((l, idx) => {{
+                for (let idx = 0; idx < layerCount; idx++) {
                     const isTarget = (idx === currentLayerIndex);
-                    if(l) l.visible = isTarget;
+                    layerVisible[idx] = isTarget ? 1 : 0;
                     const lcb = document.getElementById('layer_cb_' + idx);
                     if(lcb) lcb.checked = isTarget;
-                }});
+                }
+                updateLayerVisibility();
                 debug("Show Layer " + (currentLayerIndex + 1));
-            }}
-        }});
+            }
+        });
         
         // CHANGED VR INTERACTION: Toggle Pipe Model (Right Trigger)
-        controller1.addEventListener('selectstart', () => {{
+        controller1.addEventListener('selectstart', () => {
             const cb = document.getElementById('show3DPipe');
-            if (cb) {{
+            if (cb) {
                 cb.checked = !cb.checked;
                 cb.dispatchEvent(new Event('change'));
-            }}
-        }});
+            }
+        });
         
     
 
         // VR Button
         const vrButton = document.getElementById('vr-button');
-        if ('xr' in navigator) {{
-            navigator.xr.isSessionSupported('immersive-vr').then(ok => {{
-                if (ok) {{
+        if ('xr' in navigator) {
+            navigator.xr.isSessionSupported('immersive-vr').then(ok => {
+                if (ok) {
                     vrButton.disabled = false; vrButton.textContent = 'Enter VR';
-                    vrButton.onclick = async () => {{
-                        const session = await navigator.xr.requestSession('immersive-vr', {{ optionalFeatures: ['local-floor', 'bounded-floor'] }});
+                    vrButton.onclick = async () => {
+                        const session = await navigator.xr.requestSession('immersive-vr', { optionalFeatures: ['local-floor', 'bounded-floor'] });
                         renderer.xr.setSession(session);
                         camera.add(vrHudSprite);
+                        vrCompassState.azimuth = vrCompassState.dirX = Infinity;  // redraw the HUD on the first VR frame
                         vrButton.textContent = 'VR Active'; vrButton.disabled = true;
-                        session.addEventListener('end', () => {{ vrButton.textContent = 'Enter VR'; vrButton.disabled = false; camera.remove(vrHudSprite); }});
-                    }};
-                }} else vrButton.textContent = 'VR Not Supported';
-            }});
-        }} else vrButton.textContent = 'WebXR Not Available';
+                        session.addEventListener('end', () => { vrButton.textContent = 'Enter VR'; vrButton.disabled = false; camera.remove(vrHudSprite); requestRender(); });
+                    };
+                } else vrButton.textContent = 'VR Not Supported';
+            });
+        } else vrButton.textContent = 'WebXR Not Available';
+
+        // Compass redraws (and the VR HUD texture upload) only happen once the heading
+        // has moved ~0.5 degrees, and at most ~15 times a second
+        const COMPASS_EPSILON = 0.01, COMPASS_INTERVAL_MS = 66;
+        const vrCompassState = { azimuth: Infinity, time: 0, dirX: Infinity, dirZ: Infinity };
+        const desktopCompassState = { azimuth: Infinity, time: 0 };
+        
+        function compassNeedsRedraw(state, azimuth, now) {
+            if (Math.abs(azimuth - state.azimuth) <= COMPASS_EPSILON || now - state.time < COMPASS_INTERVAL_MS) return false;
+            state.azimuth = azimuth; state.time = now;
+            return true;
+        }
+
+        // Desktop dynamic resolution: step the pixel ratio between 0.75 and maxPixelRatio from the
+        // smoothed time between consecutive rendered frames, at most once a second
+        let lastFrameTime = 0, lastResolutionChange = 0, frameTimeAvg = 16.7;
+        function adaptResolution(now) {
+            const dt = now - lastFrameTime;
+            lastFrameTime = now;
+            if (dt > 100) return;  // idle gap from on-demand rendering, not a slow frame
+            frameTimeAvg += (dt - frameTimeAvg) * 0.1;
+            if (now - lastResolutionChange < 1000) return;
+            
+            let target = pixelRatio;
+            if (frameTimeAvg > 20) target = Math.max(Math.min(0.75, maxPixelRatio), pixelRatio - 0.125);
+            else if (frameTimeAvg < 17.5) target = Math.min(maxPixelRatio, pixelRatio + 0.125);
+            if (target !== pixelRatio) {
+                pixelRatio = target;
+                renderer.setPixelRatio(pixelRatio);
+                lastResolutionChange = now;
+            }
+        }
 
         // Render Loop
-        renderer.setAnimationLoop(() => {{
+        renderer.setAnimationLoop(() => {
             controls.update();
-            if (grabbingControllers.size === 1) {{
+            runScheduled();
+            if (!renderer.xr.isPresenting && !needsRender) return;
+            needsRender = false;
+            if (grabbingControllers.size === 1) {
                 const controller = grabbingControllers.values().next().value;
                 const data = previousTransforms.get(controller);
-                if (data) {{
-                    const newMatrix = controller.matrixWorld.clone().multiply(data.relativeMatrix);
-                    const pos = new THREE.Vector3(); const quat = new THREE.Quaternion(); const scale = new THREE.Vector3();
-                    newMatrix.decompose(pos, quat, scale);
-                    mainGroup.position.copy(pos); mainGroup.quaternion.copy(quat); mainGroup.scale.setScalar(data.startScale); 
-                }}
-            }} else if (grabbingControllers.size === 2) {{
-                const dist = controller0.position.distanceTo(controller1.position);
+                if (data) {
+                    _tmpMat.multiplyMatrices(controller.matrixWorld, data.relativeMatrix);
+                    _tmpMat.decompose(mainGroup.position, mainGroup.quaternion, _tmpScale);
+                    mainGroup.scale.setScalar(data.startScale); 
+                }
+            } else if (grabbingControllers.size === 2) {
+                // Squared distances; one sqrt of the ratio gives the scale factor
+                const distSq = controller0.position.distanceToSquared(controller1.position);
                 const data0 = previousTransforms.get(controller0);
-                if (data0 && data0.startDist > 0) {{
-                    const ratio = dist / data0.startDist;
-                    mainGroup.scale.setScalar(data0.startScale * ratio);
-                }}
-            }}
+                if (data0 && data0.startDistSq > 0) {
+                    mainGroup.scale.setScalar(data0.startScale * Math.sqrt(distSq / data0.startDistSq));
+                }
+            }
             
             let azimuth;
-            if (renderer.xr.isPresenting) {{
-                const camVec = new THREE.Vector3(); camera.getWorldDirection(camVec);
-                azimuth = Math.atan2(camVec.x, camVec.z);
-                drawCompassOnContext(vrHudCtx, azimuth, 256); vrHudTexture.needsUpdate = true;
-            }} else {{
+            const now = performance.now();
+            if (!renderer.xr.isPresenting) adaptResolution(now);
+            if (renderer.xr.isPresenting) {
+                // Only take the atan2 once the forward vector's XZ projection has actually moved
+                camera.getWorldDirection(_tmpDir);
+                const dx = _tmpDir.x - vrCompassState.dirX, dz = _tmpDir.z - vrCompassState.dirZ;
+                if (!(dx * dx + dz * dz <= 1e-5)) {
+                    azimuth = Math.atan2(_tmpDir.x, _tmpDir.z);
+                    if (compassNeedsRedraw(vrCompassState, azimuth, now)) {
+                        vrCompassState.dirX = _tmpDir.x; vrCompassState.dirZ = _tmpDir.z;
+                        drawCompassOnContext(vrHudCtx, azimuth, 256); vrHudTexture.needsUpdate = true;
+                    }
+                }
+            } else {
                 azimuth = controls.getAzimuthalAngle();
-                drawCompassOnContext(compassCtx, azimuth, 120);
-            }}
+                if (compassNeedsRedraw(desktopCompassState, azimuth, now)) {
+                    drawCompassOnContext(compassCtx, azimuth, 120);
+                } else if (Math.abs(azimuth - desktopCompassState.azimuth) > COMPASS_EPSILON) {
+                    requestRender();  // throttled; come back so the compass settles on the final heading
+                }
+            }
             
             renderer.render(scene, camera);
-        }});
+            if (!renderer.xr.isPresenting) labelRenderer.render(scene, camera);
+        });
         
-        window.addEventListener('resize', () => {{
+        window.addEventListener('resize', () => {
             camera.aspect = window.innerWidth / window.innerHeight;
             camera.updateProjectionMatrix();
+            maxPixelRatio = Math.min(window.devicePixelRatio, 1.5);
+            pixelRatio = Math.min(pixelRatio, maxPixelRatio);
+            renderer.setPixelRatio(pixelRatio);
             renderer.setSize(window.innerWidth, window.innerHeight);
-        }});
+            labelRenderer.setSize(window.innerWidth, window.innerHeight);
+            requestRender();
+        }, { passive: true });
     </script>
 </body>
-</html>'''
+</html>''')
+
+def create_vr_viewer(layer_ranges, layer_info, legend_info, output_dir, settings, data_info, job_id,
+                     has_surface=False, surface_info=None, num_slices=0, total_files=0, pipe_file=None,
+                     point_quantization=None):
+    
+    # Fix for potential missing total_files argument
+    if total_files == 0:
+        total_files = 1
+
+    edges = np.linspace(data_info['amp_min'], data_info['amp_max'], len(layer_ranges) + 1)
+    amplitude_ranges = list(zip(edges[:-1], edges[1:]))
+    
+    if point_quantization is None:
+        point_quantization = {'min': [0.0, 0.0, 0.0], 'scale': [1.0, 1.0, 1.0]}
+    write_layer_manifest(layer_ranges, amplitude_ranges, output_dir, point_quantization)
+    
+    # Surface loading code
+    surface_loader_js = ""
+    if has_surface:
+        surface_loader_js = SURFACE_LOADER_TEMPLATE.substitute(job_id=job_id)
+    
+    # Slice loading code (all slices share one merged mesh)
+    slice_loader_js = ""
+    if num_slices > 0:
+        slice_loader_js = SLICE_LOADER_TEMPLATE.substitute(job_id=job_id, num_slices=num_slices)
+    
+    pipe_loader_js = ""
+    if pipe_file:
+        pipe_loader_js = PIPE_LOADER_TEMPLATE.substitute(
+            job_id=job_id, pipe_file=pipe_file,
+            offset_x=data_info.get('offset_x', 0),
+            offset_y=data_info.get('offset_y', 0),
+            scale_factor=data_info.get('scale_factor', 1.0)
+        )
+    
+    x_len = data_info['x_max'] - data_info['x_min']
+    y_len = data_info['y_max'] - data_info['y_min']
+    z_len = abs(data_info['z_max'] - data_info['z_min'])
+
+    html_content = VIEWER_TEMPLATE.substitute(
+        original_filename=data_info['original_filename'],
+        total_points=f"{data_info['total_points']:,}",
+        x_dim=f"{x_len:.2f}", y_dim=f"{y_len:.2f}", z_dim=f"{z_len:.2f}",
+        x_len=x_len, y_len=y_len, z_len=z_len,
+        ground_size=round(max(x_len, y_len) * 1.5, 3),
+        box_edges=json.dumps(np.round(box_edge_positions(x_len, y_len, z_len), 6).tolist(), separators=(',', ':')),
+        color_palette=settings['color_palette'],
+        point_size=settings['vr_point_size'],
+        surface_opacity=settings['surface_opacity'],
+        font_size_multiplier=settings.get('font_size_multiplier', 1.0),
+        font_family=settings.get('font_family', 'Arial'),
+        layer_info=layer_info,
+        legend_info=legend_info,
+        num_slices=num_slices,
+        num_layers=len(layer_ranges),
+        total_files=total_files,
+        pipe_display='block' if pipe_file else 'none',
+        processing_date=data_info['processing_date'],
+        job_id=job_id,
+        surface_loader_js=surface_loader_js,
+        slice_loader_js=slice_loader_js,
+        pipe_loader_js=pipe_loader_js
+    )
     
     with open(os.path.join(output_dir, 'index.html'), 'w', encoding='utf-8') as f:
         f.write(html_content)
 
+def quantile_partition(values, q):
+    """
+    Linear-interpolated q-quantile of values (same result as np.quantile) from a single
+    np.partition. Also returns the partitioned copy and the index from which its tail
+    holds every value above the quantile.
+    """
+    n = len(values)
+    pos = (n - 1) * q
+    k = int(np.floor(pos))
+    kth = [k, min(k + 1, n - 1)]
+    part = np.partition(values, kth)
+    lo, hi = part[kth[0]], part[kth[1]]
+    # numpy's lerp, which interpolates from the nearer end
+    t = pos - k
+    quantile = lo + (hi - lo) * t if t < 0.5 else hi - (hi - lo) * (1 - t)
+    return quantile, part, kth[1]
+
+def read_csv_columns(filepath, col_indices):
+    """
+    Read only the columns at col_indices from a CSV with a header row.
+    Returns (column count, list of Series in col_indices order), or
+    (column count, None) when an index is past the last column.
+    """
+    if HAVE_POLARS:
+        try:
+            num_columns = len(pl.read_csv(filepath, n_rows=0, encoding='utf8-lossy').columns)
+            if num_columns <= max(col_indices):
+                return num_columns, None
+            # Everything is read as text and cast afterwards, like pd.to_numeric(errors='coerce');
+            # padding is stripped first (pandas parses " 1.5" from ", "-separated exports)
+            wanted = sorted(set(col_indices))
+            frame = pl.read_csv(filepath, columns=wanted, encoding='utf8-lossy', infer_schema_length=0)
+            names = dict(zip(wanted, frame.columns))
+            print("Read with polars")
+            return num_columns, [pd.Series(frame[names[i]].str.strip_chars()
+                                           .cast(pl.Float64, strict=False).to_numpy())
+                                 for i in col_indices]
+        except Exception as e:
+            print(f"Polars read failed, falling back to pandas: {e}")
+    
+    encodings = ['utf-8', 'latin1', 'ISO-8859-1', 'cp1252', 'utf-16', 'ascii']
+    attempts = [{'encoding': encoding} for encoding in encodings] + [{'encoding_errors': 'ignore'}]
+    for attempt, kwargs in enumerate(attempts):
+        try:
+            header = pd.read_csv(filepath, nrows=0, **kwargs).columns
+            if len(header) <= max(col_indices):
+                return len(header), None
+            df = pd.read_csv(filepath, usecols=sorted(set(col_indices)), **kwargs)
+            print(f"Successfully read with {kwargs.get('encoding', 'encoding errors ignored')}")
+            return len(header), [df[header[i]] for i in col_indices]
+        except (UnicodeDecodeError, pd.errors.ParserError) as e:
+            # The last attempt ignores encoding errors; let anything it hits propagate
+            if attempt == len(attempts) - 1:
+                raise
+            print(f"Failed with {kwargs['encoding']}: {e}")
+
 def process_gpr_data(job_id, filepath, settings, original_filename):
     """Process GPR data in a separate thread"""
     try:
-        processing_jobs[job_id]['status'] = 'processing'
-        processing_jobs[job_id]['message'] = 'Loading CSV file...'
+        update_job(job_id, status='processing', message='Loading CSV file...', progress=5)
         
         print(f"Processing job {job_id}: {original_filename}")
         print(f"Using color palette: {settings['color_palette']}")
@@ -1336,44 +1901,24 @@ def process_gpr_data(job_id, filepath, settings, original_filename):
             if os.path.exists(src):
                 shutil.copy(src, dst)
 
-        # Load data with encoding handling
-        processing_jobs[job_id]['message'] = 'Detecting file encoding...'
-        encodings = ['utf-8', 'latin1', 'ISO-8859-1', 'cp1252', 'utf-16', 'ascii']
-        df = None
-        
-        for encoding in encodings:
-            try:
-                df = pd.read_csv(filepath, encoding=encoding)
-                print(f"Successfully read with {encoding} encoding")
-                break
-            except (UnicodeDecodeError, pd.errors.ParserError) as e:
-                print(f"Failed with {encoding}: {e}")
-                continue
-        
-        if df is None:
-            # Try with error handling
-            try:
-                df = pd.read_csv(filepath, encoding_errors='ignore')
-                print("Read with encoding errors ignored")
-            except Exception as e:
-                processing_jobs[job_id]['status'] = 'error'
-                processing_jobs[job_id]['message'] = f'Failed to read CSV file: {str(e)}'
-                return
-        
-        processing_jobs[job_id]['message'] = f'Found {len(df):,} rows, processing...'
+        # Load data with encoding handling; only the four selected columns are parsed
+        update_job(job_id, message='Detecting file encoding...', progress=10)
+        col_indices = [settings['col_idx_x'], settings['col_idx_y'], settings['col_idx_z'], settings['col_idx_amplitude']]
+        try:
+            num_columns, columns = read_csv_columns(filepath, col_indices)
+        except Exception as e:
+            update_job(job_id, status='error', message=f'Failed to read CSV file: {str(e)}')
+            return
         
         # Check if columns exist
-        if len(df.columns) <= max(settings['col_idx_x'], settings['col_idx_y'], 
-                                 settings['col_idx_z'], settings['col_idx_amplitude']):
-            processing_jobs[job_id]['status'] = 'error'
-            processing_jobs[job_id]['message'] = f'CSV file has only {len(df.columns)} columns, but need column index {max(settings["col_idx_x"], settings["col_idx_y"], settings["col_idx_z"], settings["col_idx_amplitude"])}'
+        if columns is None:
+            update_job(job_id, status='error', message=f'CSV file has only {num_columns} columns, but need column index {max(col_indices)}')
             return
         
+        update_job(job_id, message=f'Found {len(columns[0]):,} rows, processing...', progress=20)
+        
         # Extract data
-        raw_x = pd.to_numeric(df.iloc[:, settings['col_idx_x']], errors='coerce')
-        raw_y = pd.to_numeric(df.iloc[:, settings['col_idx_y']], errors='coerce')
-        raw_z = pd.to_numeric(df.iloc[:, settings['col_idx_z']], errors='coerce')
-        raw_amp = pd.to_numeric(df.iloc[:, settings['col_idx_amplitude']], errors='coerce')
+        raw_x, raw_y, raw_z, raw_amp = (pd.to_numeric(col, errors='coerce') for col in columns)
         
         # Create dataframe
         data = pd.DataFrame({
@@ -1381,8 +1926,7 @@ def process_gpr_data(job_id, filepath, settings, original_filename):
         }).dropna()
         
         if len(data) == 0:
-            processing_jobs[job_id]['status'] = 'error'
-            processing_jobs[job_id]['message'] = 'No valid numeric data found in specified columns'
+            update_job(job_id, status='error', message='No valid numeric data found in specified columns')
             return
         
         # Process coordinates
@@ -1404,14 +1948,21 @@ def process_gpr_data(job_id, filepath, settings, original_filename):
             data['y'] *= sf
             data['z'] *= sf
         
-        # Filter by amplitude
+        # Centering and scaling ran in float64 (survey coordinates need the digits);
+        # the local coordinates and amplitudes are stored as float32 from here on
+        data = data.astype(np.float32)
+        
+        # Filter by amplitude; the partition that finds the threshold leaves every amplitude
+        # above it in its tail, so the layer quantiles below only scan that tail
         data['abs_amp'] = data['amp'].abs()
-        threshold = data['abs_amp'].quantile(settings['threshold_percentile'])
+        threshold, amp_partitioned, tail_start = quantile_partition(data['abs_amp'].to_numpy(), settings['threshold_percentile'])
+        amp_tail = amp_partitioned[tail_start:]
+        amp_above = amp_tail[amp_tail > threshold]
+        del amp_partitioned, amp_tail
         df_filtered = data[data['abs_amp'] > threshold].copy()
         
         if len(df_filtered) == 0:
-            processing_jobs[job_id]['status'] = 'error'
-            processing_jobs[job_id]['message'] = 'No points after filtering! Try lowering the percentile.'
+            update_job(job_id, status='error', message='No points after filtering! Try lowering the percentile.')
             return
         
         amp_min = df_filtered['abs_amp'].min()
@@ -1431,7 +1982,7 @@ def process_gpr_data(job_id, filepath, settings, original_filename):
         num_slices = 0
         
         if settings['generate_surface']:
-            processing_jobs[job_id]['message'] = 'Generating surfaces...'
+            update_job(job_id, message='Generating surfaces...', progress=35)
             
             try:
                 palette_name = settings.get('color_palette', 'Viridis')
@@ -1440,8 +1991,8 @@ def process_gpr_data(job_id, filepath, settings, original_filename):
                         df_filtered, 'x', 'y', 'z', 'abs_amp', settings['surface_resolution'],
                         palette_name=palette_name
                     )
-                    write_obj_mesh(
-                        os.path.join(output_dir, 'surface_amplitude.obj'),
+                    write_glb_mesh(
+                        os.path.join(output_dir, 'surface_amplitude.glb'),
                         vertices, faces, colors
                     )
                 
@@ -1454,28 +2005,31 @@ def process_gpr_data(job_id, filepath, settings, original_filename):
                     )
                     num_slices = len(slices)
                     
-                    for i, slice_data in enumerate(slices):
-                        write_obj_mesh(
-                            os.path.join(output_dir, f'slice_{i+1}.obj'),
-                            slice_data['vertices'],
-                            slice_data['faces'],
-                            slice_data['colors']
+                    if num_slices > 0:
+                        write_glb_mesh(
+                            os.path.join(output_dir, 'slices.glb'),
+                            *merge_slice_meshes(slices)
                         )
                     
             except Exception as e:
                 print(f"Surface generation error: {e}")
         
         # Create layers - IMPORTANT: Keep coordinates as they are!
-        processing_jobs[job_id]['message'] = 'Creating amplitude layers...'
+        update_job(job_id, message='Creating amplitude layers...', progress=60)
         try:
-            df_filtered['iso_range'] = pd.qcut(df_filtered['abs_amp'], settings['iso_bins'], labels=False, duplicates='drop')
+            # Equal-count bins (as pd.qcut with duplicates='drop'): all edges from one quantile call
+            # Right-closed bins with the lowest edge included; a single distinct amplitude is one layer
+            edges = np.unique(np.quantile(amp_above, np.linspace(0, 1, settings['iso_bins'] + 1)))
+            iso_range = np.searchsorted(edges, df_filtered['abs_amp'].to_numpy(), side='left') - 1
+            df_filtered['iso_range'] = np.maximum(iso_range, 0)
         except:
             # If qcut fails, use manual binning
             df_filtered['iso_range'] = pd.cut(df_filtered['abs_amp'], bins=settings['iso_bins'], labels=False)
         
         actual_bins = df_filtered['iso_range'].nunique()
         
-        ply_files = []
+        layer_points = []
+        layer_colors = []
         layer_info_html = ""
         legend_html = ""
         amplitude_ranges = []
@@ -1500,31 +2054,37 @@ def process_gpr_data(job_id, filepath, settings, original_filename):
         </div>
         '''
         
+        # Group rows by layer in one pass instead of one boolean mask per layer
+        iso_labels = df_filtered['iso_range'].to_numpy(dtype=np.float64, na_value=-1)
+        layer_order, layer_offsets = group_by_bin(iso_labels, actual_bins)
+        xyz = df_filtered[['x', 'y', 'z']].to_numpy(dtype=np.float32)
+        abs_amp = df_filtered['abs_amp'].to_numpy()
+        
         for iso_level in range(actual_bins):
-            iso_data = df_filtered[df_filtered['iso_range'] == iso_level]
-            if len(iso_data) == 0:
+            rows = layer_order[layer_offsets[iso_level]:layer_offsets[iso_level + 1]]
+            if len(rows) == 0:
                 continue
             
-            if len(iso_data) > settings['max_points_per_layer']:
-                iso_data = iso_data.sample(n=settings['max_points_per_layer'], random_state=42)
-            
-            # Use the actual coordinates
-            x = iso_data['x'].values
-            y = iso_data['y'].values
-            z = iso_data['z'].values
+            if len(rows) > settings['max_points_per_layer']:
+                # Generator.choice without the final shuffle; sorted so rows keep file order
+                rng = np.random.default_rng(42)
+                keep = rng.choice(len(rows), size=settings['max_points_per_layer'], replace=False, shuffle=False)
+                keep.sort()
+                rows = rows[keep]
             
-            color = get_color_from_palette(iso_level, palette_name)
-            colors = np.full((len(iso_data), 3), color)
-            points = np.column_stack((x, y, z))
+            # Use the actual coordinates; fancy indexing already yields a new float32 block
+            points = xyz[rows]
             
-            iso_min, iso_max = iso_data['abs_amp'].min(), iso_data['abs_amp'].max()
-            filename = f"layer_{iso_level+1}.ply"
-            filepath_ply = os.path.join(output_dir, filename)
+            # One LUT row viewed across the whole layer, no per-point copy
+            color = create_iso_colormap(iso_level, actual_bins, palette_name)
+            colors = np.broadcast_to(color, (len(rows), 3))
             
-            write_ply_fast(filepath_ply, points, colors)
-            ply_files.append(filepath_ply)
+            iso_amp = abs_amp[rows]
+            iso_min, iso_max = iso_amp.min(), iso_amp.max()
+            layer_points.append(points)
+            layer_colors.append(colors)
             amplitude_ranges.append((float(iso_min), float(iso_max)))
-            total_output_points += len(iso_data)
+            total_output_points += len(rows)
             
             color_hex = '#{:02x}{:02x}{:02x}'.format(*color)
             
@@ -1545,8 +2105,11 @@ def process_gpr_data(job_id, filepath, settings, original_filename):
                 <span class="legend-label">{iso_min:.0f} - {iso_max:.0f}</span>
             </div>'''
         
+        # All layers go into one buffer the viewer draws as a single instanced mesh
+        layer_ranges, point_quantization = write_point_buffer(os.path.join(output_dir, 'points.bin'), layer_points, layer_colors)
+        
         # Create viewer
-        processing_jobs[job_id]['message'] = 'Creating VR viewer...'
+        update_job(job_id, message='Creating VR viewer...', progress=85)
         
         data_info = {
             'original_filename': original_filename,
@@ -1566,21 +2129,22 @@ def process_gpr_data(job_id, filepath, settings, original_filename):
         }
         
         # Calculate total files for loading
-        total_files = len(ply_files)
+        total_files = 1  # points.bin
         if settings['generate_surface']:
-            total_files += 1  # surface_amplitude.obj
+            total_files += 1  # surface_amplitude.glb
         if num_slices > 0:
-            total_files += num_slices  # depth slices
+            total_files += 1  # slices.glb
         if settings.get('pipe_filename'):
             total_files += 1 # pipe file
         
         create_vr_viewer(
-            ply_files, layer_info_html, legend_html, output_dir, settings, data_info, job_id,
+            layer_ranges, layer_info_html, legend_html, output_dir, settings, data_info, job_id,
             has_surface=settings['generate_surface'], 
             surface_info=surface_info, 
             num_slices=num_slices,
             total_files=total_files,
-            pipe_file=settings.get('pipe_filename')
+            pipe_file=settings.get('pipe_filename'),
+            point_quantization=point_quantization
         )
         
         # Save info
@@ -1596,10 +2160,8 @@ def process_gpr_data(job_id, filepath, settings, original_filename):
         with open(os.path.join(output_dir, 'info.json'), 'w', encoding='utf-8') as f:
             json.dump(info_data, f, indent=2)
         
-        processing_jobs[job_id]['status'] = 'completed'
-        processing_jobs[job_id]['message'] = 'Processing complete!'
-        processing_jobs[job_id]['output_dir'] = job_id
-        processing_jobs[job_id]['data_info'] = data_info
+        update_job(job_id, status='completed', message='Processing complete!', progress=100,
+                   output_dir=job_id, data_info=data_info)
         
         print(f"Job {job_id} completed successfully")
         
@@ -1607,30 +2169,136 @@ def process_gpr_data(job_id, filepath, settings, original_filename):
         print(f"Error processing job {job_id}: {e}")
         import traceback
         traceback.print_exc()
-        processing_jobs[job_id]['status'] = 'error'
-        processing_jobs[job_id]['message'] = f'Error: {str(e)}'
+        update_job(job_id, status='error', message=f'Error: {str(e)}')
 
 # Flask Routes
+@app.template_global()
+def asset_url(filename):
+    """URL of a static asset, versioned by its content so it can be cached as immutable"""
+    with open(os.path.join(app.static_folder, filename), 'rb') as f:
+        version = hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+    return url_for('static', filename=filename, v=version)
+
+@app.after_request
+def cache_versioned_assets(response):
+    # A versioned URL never changes content, so browsers may keep it for a year
+    if request.endpoint == 'static' and request.args.get('v') and response.status_code == 200:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    return response
+
 @app.route('/')
 def index():
-    return render_template('index.html', default_settings=DEFAULT_SETTINGS, color_palettes=list(COLOR_PALETTES.keys()))
+    # Render and compress once; debug mode re-renders so template edits still show up
+    if not index_page_cache or app.debug:
+        body = render_template('index.html', default_settings=DEFAULT_SETTINGS,
+                               color_palettes=list(COLOR_PALETTES.keys())).encode('utf-8')
+        index_page_cache['identity'] = body
+        index_page_cache['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+    
+    encoding = 'gzip' if request.accept_encodings['gzip'] > 0 else 'identity'
+    response = Response(index_page_cache[encoding], mimetype='text/html')
+    if encoding == 'gzip':
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
-@app.route('/upload', methods=['POST'])
-def upload_file():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
+@app.route('/upload/begin', methods=['POST'])
+def begin_upload():
+    """Reserve a job ID and an empty upload file for a chunked upload"""
+    filename = secure_filename(request.form.get('filename', ''))
+    try:
+        size = int(request.form.get('size', ''))
+    except ValueError:
+        return jsonify({'error': 'Missing file size'}), 400
+    if not filename:
         return jsonify({'error': 'No file selected'}), 400
+    if size > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'error': 'File too large'}), 413
     
-    # Generate job ID
-    job_id = str(uuid.uuid4())[:8]
+    # Abandoned uploads are cleared out whenever a new one starts
+    reap_stale_uploads()
     
-    # Save file
-    filename = secure_filename(file.filename)
+    job_id = str(uuid.uuid4())[:8]
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
-    file.save(filepath)
+    open(filepath, 'wb').close()
+    with chunked_uploads_lock:
+        chunked_uploads[job_id] = {'filename': filename, 'filepath': filepath, 'size': size,
+                                   'lock': threading.Lock(), 'touched': time.time()}
+    return jsonify({'upload_id': job_id})
+
+@app.route('/upload/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Append one Content-Range chunk to a chunked upload, streaming it straight to disk"""
+    with chunked_uploads_lock:
+        upload = chunked_uploads.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    # Content-Range: bytes <start>-<end>/<total>; chunks must arrive in order
+    try:
+        unit, _, spec = request.headers.get('Content-Range', '').partition(' ')
+        span, _, total = spec.partition('/')
+        start, end = (int(v) for v in span.split('-'))
+        total = int(total)
+    except ValueError:
+        return jsonify({'error': 'Invalid Content-Range'}), 400
+    if unit != 'bytes' or total != upload['size'] or end < start or end >= total:
+        return jsonify({'error': 'Invalid Content-Range'}), 400
+    
+    # One chunk at a time per upload, so the offset check and the append can't interleave
+    with upload['lock']:
+        if chunked_uploads.get(upload_id) is not upload:
+            # Reaped or finished while this request waited for the lock
+            return jsonify({'error': 'Upload not found'}), 404
+        received = os.path.getsize(upload['filepath'])
+        if start != received:
+            return jsonify({'error': 'Unexpected chunk offset', 'received': received}), 409
+        
+        with open(upload['filepath'], 'ab') as f:
+            shutil.copyfileobj(request.stream, f, 1024 * 1024)
+        upload['touched'] = time.time()
+        received = os.path.getsize(upload['filepath'])
+        if received != end + 1:
+            return jsonify({'error': 'Incomplete chunk', 'received': received}), 400
+    return jsonify({'received': received})
+
+@app.route('/upload', methods=['POST'])
+def upload_file():
+    upload_id = request.form.get('upload_id')
+    if upload_id:
+        # File already arrived through /upload/<upload_id>; the upload ID becomes the job ID
+        with chunked_uploads_lock:
+            upload = chunked_uploads.get(upload_id)
+        if upload is None:
+            return jsonify({'error': 'Upload not found'}), 404
+        with upload['lock']:
+            if chunked_uploads.get(upload_id) is not upload:
+                return jsonify({'error': 'Upload not found'}), 404
+            if os.path.getsize(upload['filepath']) != upload['size']:
+                return jsonify({'error': 'Upload incomplete'}), 400
+            with chunked_uploads_lock:
+                del chunked_uploads[upload_id]
+        job_id = upload_id
+        filename = upload['filename']
+        filepath = upload['filepath']
+    else:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file uploaded'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        # Generate job ID
+        job_id = str(uuid.uuid4())[:8]
+        
+        # Save file
+        filename = secure_filename(file.filename)
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
+        file.save(filepath)
     
     # Save Pipe File if present
     pipe_filename = None
@@ -1663,12 +2331,14 @@ def upload_file():
         settings['pipe_filename'] = pipe_filename
     
     # Initialize job tracking
-    processing_jobs[job_id] = {
-        'status': 'pending',
-        'message': 'Waiting to start...',
-        'filename': filename,
-        'settings': settings
-    }
+    with job_updates:
+        processing_jobs[job_id] = {
+            'status': 'pending',
+            'message': 'Waiting to start...',
+            'progress': 0,
+            'filename': filename,
+            'settings': settings
+        }
     
     # Start processing in background thread
     thread = threading.Thread(
@@ -1687,6 +2357,33 @@ def get_status(job_id):
     
     return jsonify(processing_jobs[job_id])
 
+@app.route('/events/<job_id>')
+def job_events(job_id):
+    """Server-Sent Events stream of a job's status, pushed whenever the worker updates it"""
+    if job_id not in processing_jobs:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        last = None
+        while True:
+            with job_updates:
+                changed = job_updates.wait_for(lambda: processing_jobs.get(job_id) != last, timeout=15)
+                job = processing_jobs.get(job_id)
+                state = dict(job) if job is not None else None
+            if state is None:
+                yield f"data: {json.dumps({'error': 'Job not found'})}\n\n"
+                return
+            if not changed:
+                yield ": keep-alive\n\n"  # lets the server notice clients that went away
+                continue
+            last = state
+            yield f"data: {json.dumps(state)}\n\n"
+            if state['status'] in ('completed', 'error'):
+                return
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/view/<job_id>')
 def view_result(job_id):
     output_dir = os.path.join(app.config['PROCESSED_FOLDER'], job_id)
@@ -1723,8 +2420,7 @@ def download_result(job_id):
     if not os.path.exists(output_dir):
         return "Job not found", 404
     
-    # Create zip file
-    import zipfile
+    # Create zip file, streaming each entry in 1 MB chunks
     zip_path = os.path.join(app.config['PROCESSED_FOLDER'], f'{job_id}.zip')
     
     with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
@@ -1732,13 +2428,27 @@ def download_result(job_id):
             for file in files:
                 file_path = os.path.join(root, file)
                 arcname = os.path.relpath(file_path, output_dir)
-                zipf.write(file_path, arcname)
+                zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+                # Binary float data barely compresses; store it and skip the deflate CPU
+                if os.path.splitext(file)[1].lower() in STORED_ZIP_EXTENSIONS:
+                    zinfo.compress_type = zipfile.ZIP_STORED
+                else:
+                    zinfo.compress_type = zipfile.ZIP_DEFLATED
+                with open(file_path, 'rb') as src, zipf.open(zinfo, 'w', force_zip64=True) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
     
     return send_file(zip_path, as_attachment=True, download_name=f'gpr_vr_{job_id}.zip')
 
-@app.route('/cleanup/<job_id>')
+@app.route('/cleanup/<job_id>', methods=['GET', 'POST'])
 def cleanup_job(job_id):
-    if job_id in processing_jobs:
+    job = processing_jobs.get(job_id)
+    if job is not None and job['status'] in ('pending', 'processing'):
+        # The worker still owns the upload and output dir; leave them alone
+        if request.method == 'POST':
+            return '', 409
+        return jsonify({'error': 'Job still processing'}), 409
+
+    if job is not None:
         # Clean up files
         upload_file = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_*")
         import glob
@@ -1762,763 +2472,17 @@ def cleanup_job(job_id):
             except:
                 pass
         
-        del processing_jobs[job_id]
+        # An overlapping cleanup (beacon plus button) may already have removed it
+        with job_updates:
+            processing_jobs.pop(job_id, None)
+            job_updates.notify_all()
     
+    # navigator.sendBeacon posts and ignores the response body
+    if request.method == 'POST':
+        return '', 204
     return jsonify({'success': True})
 
 if __name__ == "__main__":
-    # Create templates directory if it doesn't exist
-    if not os.path.exists('templates'):
-        os.makedirs('templates')
-    
-    # Create HTML template with enhanced color palette selection
-    html_template = '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>GPR VR Viewer - Upload</title>
-    <style>
-        body {
-            font-family: Arial, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            margin: 0;
-            padding: 20px;
-        }
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 10px;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.3);
-            overflow: hidden;
-        }
-        header {
-            background: #1a1a2e;
-            color: white;
-            padding: 30px;
-            text-align: center;
-        }
-        header h1 {
-            margin: 0;
-            font-size: 2.5em;
-        }
-        header p {
-            color: #aaa;
-            margin: 10px 0 0;
-        }
-        .content {
-            display: flex;
-            min-height: 600px;
-        }
-        .upload-section {
-            flex: 1;
-            padding: 40px;
-            background: #f8f9fa;
-        }
-        .settings-section {
-            flex: 1;
-            padding: 40px;
-            background: white;
-            border-left: 1px solid #ddd;
-            overflow-y: auto;
-            max-height: 600px;
-        }
-        .form-group {
-            margin-bottom: 20px;
-        }
-        label {
-            display: block;
-            margin-bottom: 8px;
-            font-weight: bold;
-            color: #333;
-        }
-        input[type="file"] {
-            width: 100%;
-            padding: 15px;
-            border: 2px dashed #667eea;
-            border-radius: 5px;
-            background: white;
-            cursor: pointer;
-        }
-        input[type="number"], input[type="text"], select {
-            width: 100%;
-            padding: 10px;
-            border: 1px solid #ddd;
-            border-radius: 5px;
-            box-sizing: border-box;
-        }
-        .checkbox-group {
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }
-        .checkbox-group input[type="checkbox"] {
-            width: auto;
-        }
-        .btn {
-            background: #667eea;
-            color: white;
-            border: none;
-            padding: 15px 30px;
-            border-radius: 5px;
-            font-size: 16px;
-            cursor: pointer;
-            transition: background 0.3s;
-            width: 100%;
-            margin-top: 20px;
-        }
-        .btn:hover {
-            background: #5a67d8;
-        }
-        .btn:disabled {
-            background: #ccc;
-            cursor: not-allowed;
-        }
-        .status-area {
-            margin-top: 20px;
-            padding: 15px;
-            background: #f8f9fa;
-            border-radius: 5px;
-            display: none;
-        }
-        #progressBar {
-            width: 100%;
-            height: 20px;
-            background: #ddd;
-            border-radius: 10px;
-            overflow: hidden;
-            margin: 10px 0;
-        }
-        #progressFill {
-            width: 0%;
-            height: 100%;
-            background: linear-gradient(90deg, #667eea, #764ba2);
-            transition: width 0.3s;
-        }
-        .setting-category {
-            background: #f1f3f5;
-            padding: 15px;
-            border-radius: 5px;
-            margin-bottom: 20px;
-        }
-        .setting-category h3 {
-            margin-top: 0;
-            color: #495057;
-            border-bottom: 2px solid #667eea;
-            padding-bottom: 5px;
-        }
-        .setting-row {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 10px;
-        }
-        .setting-label {
-            flex: 1;
-            font-size: 14px;
-        }
-        .setting-control {
-            flex: 1;
-        }
-        .small-input {
-            width: 80px;
-        }
-        #fileInfo {
-            background: #e7f3ff;
-            padding: 10px;
-            border-radius: 5px;
-            margin-top: 10px;
-            font-size: 14px;
-        }
-        .help-text {
-            font-size: 12px;
-            color: #666;
-            margin-top: 5px;
-        }
-        .completed-actions {
-            display: flex;
-            gap: 10px;
-            margin-top: 20px;
-        }
-        .completed-actions .btn {
-            flex: 1;
-            margin-top: 0;
-        }
-        .btn-view {
-            background: #10b981;
-        }
-        .btn-view:hover {
-            background: #0da271;
-        }
-        .btn-download {
-            background: #3b82f6;
-        }
-        .btn-download:hover {
-            background: #2563eb;
-        }
-        .instructions {
-            background: #fff3cd;
-            border: 1px solid #ffeaa7;
-            border-radius: 5px;
-            padding: 15px;
-            margin-top: 30px;
-        }
-        .instructions h3 {
-            margin-top: 0;
-            color: #856404;
-        }
-        .instructions ul {
-            padding-left: 20px;
-        }
-        .instructions li {
-            margin-bottom: 5px;
-        }
-        
-        /* Color palette preview */
-        .palette-preview {
-            display: flex;
-            height: 30px;
-            margin-top: 5px;
-            border-radius: 3px;
-            overflow: hidden;
-            border: 1px solid #ddd;
-        }
-        .palette-color {
-            flex: 1;
-            height: 100%;
-        }
-        .palette-info {
-            font-size: 11px;
-            color: #666;
-            margin-top: 2px;
-        }
-        
-        /* Palette grid */
-        .palette-grid {
-            display: grid;
-            grid-template-columns: repeat(2, 1fr);
-            gap: 8px;
-            margin-top: 10px;
-        }
-        .palette-option {
-            border: 2px solid #ddd;
-            border-radius: 5px;
-            padding: 5px;
-            cursor: pointer;
-            transition: all 0.2s;
-        }
-        .palette-option:hover {
-            border-color: #667eea;
-            background: #f8f9ff;
-        }
-        .palette-option.selected {
-            border-color: #4CAF50;
-            background: #f0fff0;
-        }
-        .palette-name {
-            font-size: 12px;
-            font-weight: bold;
-            margin-bottom: 5px;
-        }
-        .palette-mini-preview {
-            display: flex;
-            height: 15px;
-            border-radius: 2px;
-            overflow: hidden;
-        }
-        .palette-mini-color {
-            flex: 1;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-<header>
-    <div style="display: flex; align-items: center; justify-content: center; gap: 20px; padding: 10px;">
-        <img src="/static/logo.jpeg" alt="GPR VR Viewer Logo" style="height: 70px; width: auto; border-radius: 5px;">
-        <div style="text-align: left;">
-            <h1 style="margin: 0; font-size: 2.2em;">GPR VR Viewer</h1>
-            <p style="margin: 5px 0 0; color: #aaa;">Upload GPR CSV data and generate interactive 3D VR visualizations</p>
-        </div>
-    </div>
-</header>
-        
-        <div class="content">
-            <div class="upload-section">
-                <h2>1. Upload CSV File</h2>
-                <div class="form-group">
-                    <label for="fileInput">GPR Data File (.csv)</label>
-                    <input type="file" id="fileInput" accept=".csv,.txt">
-                    <div id="fileInfo" style="display: none;"></div>
-                </div>
-                
-                <div class="form-group" style="border-top:1px dashed #ccc; padding-top:10px;">
-                    <label for="pipeInput">Optional: 3D Pipe Model (.ply)</label>
-                    <input type="file" id="pipeInput" accept=".ply">
-                </div>
-                
-                <div class="instructions">
-                    <h3>File Requirements:</h3>
-                    <ul>
-                        <li>CSV or text format</li>
-                        <li>Default column indices: X(0), Y(1), Z(7), Amplitude(8)</li>
-                        <li>Adjust indices in settings if needed</li>
-                        <li>Supports large files (up to 1GB)</li>
-                        <li>Auto-detects encoding (UTF-8, Latin-1, etc.)</li>
-                    </ul>
-                </div>
-                
-                <button class="btn" id="processBtn" onclick="processFile()" disabled>Process File</button>
-                
-                <div class="status-area" id="statusArea">
-                    <h3>Processing Status</h3>
-                    <div id="statusMessage">Waiting to start...</div>
-                    <div id="progressBar">
-                        <div id="progressFill"></div>
-                    </div>
-                    <div id="progressText">0%</div>
-                    
-                    <div id="completedActions" class="completed-actions" style="display: none;">
-                        <button class="btn btn-view" onclick="viewResult()">View in 3D</button>
-                        <button class="btn btn-download" onclick="downloadResult()">Download All Files</button>
-                        <button class="btn" onclick="newFile()" style="background: #6c757d;">Process Another</button>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="settings-section">
-                <h2>2. Processing Settings</h2>
-                
-                <div class="setting-category">
-                    <h3>Data Columns (0-based indices)</h3>
-                    <div class="setting-row">
-                        <div class="setting-label">X Column:</div>
-                        <div class="setting-control">
-                            <input type="number" id="colIdxX" value="{{ default_settings.col_idx_x }}" min="0" max="100" class="small-input">
-                        </div>
-                    </div>
-                    <div class="setting-row">
-                        <div class="setting-label">Y Column:</div>
-                        <div class="setting-control">
-                            <input type="number" id="colIdxY" value="{{ default_settings.col_idx_y }}" min="0" max="100" class="small-input">
-                        </div>
-                    </div>
-                    <div class="setting-row">
-                        <div class="setting-label">Z (Depth) Column:</div>
-                        <div class="setting-control">
-                            <input type="number" id="colIdxZ" value="{{ default_settings.col_idx_z }}" min="0" max="100" class="small-input">
-                        </div>
-                    </div>
-                    <div class="setting-row">
-                        <div class="setting-label">Amplitude Column:</div>
-                        <div class="setting-control">
-                            <input type="number" id="colIdxAmplitude" value="{{ default_settings.col_idx_amplitude }}" min="0" max="100" class="small-input">
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="setting-category">
-                    <h3>Color Palette Selection</h3>
-                    <div class="setting-row">
-                        <div class="setting-label">Selected Palette:</div>
-                        <div class="setting-control">
-                            <select id="colorPaletteSelect">
-                                {% for palette in color_palettes %}
-                                <option value="{{ palette }}" {% if palette == default_settings.color_palette %}selected{% endif %}>{{ palette }}</option>
-                                {% endfor %}
-                            </select>
-                        </div>
-                    </div>
-                    
-                    <div id="palettePreviewContainer">
-                        <div class="palette-preview" id="palettePreview"></div>
-                        <div class="palette-info" id="paletteInfo">Click on palette below for preview</div>
-                    </div>
-                    
-                    <div class="palette-grid" id="paletteGrid">
-                        {% for palette in color_palettes %}
-                        <div class="palette-option {% if palette == default_settings.color_palette %}selected{% endif %}" 
-                             data-palette="{{ palette }}"
-                             onclick="selectPalette('{{ palette }}')">
-                            <div class="palette-name">{{ palette }}</div>
-                            <div class="palette-mini-preview" id="miniPreview{{ palette }}"></div>
-                        </div>
-                        {% endfor %}
-                    </div>
-                    
-                    <div class="help-text">
-                        <strong>Recommended:</strong><br>
-                        • <strong>Viridis/Plasma/Inferno/Magma:</strong> Scientific, colorblind-friendly<br>
-                        • <strong>Seismic:</strong> Traditional geophysics (blue-white-red)<br>
-                        • <strong>RdBu/Spectral:</strong> Diverging data (high contrast)<br>
-                        • <strong>Rainbow:</strong> Classic but not colorblind-friendly<br>
-                        • <strong>Grayscale:</strong> For printing or monochrome displays
-                    </div>
-                </div>
-                
-                <div class="setting-category">
-                    <h3>Processing Settings</h3>
-                    <div class="setting-row">
-                        <div class="setting-label">Amplitude Percentile:</div>
-                        <div class="setting-control">
-                            <input type="number" id="thresholdPercentile" value="{{ default_settings.threshold_percentile }}" min="0.5" max="1" step="0.01" class="small-input">
-                            <div class="help-text">Higher = fewer but stronger points</div>
-                        </div>
-                    </div>
-                    <div class="setting-row">
-                        <div class="setting-label">Amplitude Layers:</div>
-                        <div class="setting-control">
-                            <input type="number" id="isoBins" value="{{ default_settings.iso_bins }}" min="1" max="10" class="small-input">
-                        </div>
-                    </div>
-                    <div class="setting-row">
-                        <div class="setting-label">Max Points per Layer:</div>
-                        <div class="setting-control">
-                            <input type="number" id="maxPointsPerLayer" value="{{ default_settings.max_points_per_layer }}" min="1000" max="1000000" step="1000" class="small-input">
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="setting-category">
-                    <h3>Surface Generation</h3>
-                    <div class="checkbox-group">
-                        <input type="checkbox" id="generateSurface" checked>
-                        <label for="generateSurface">Generate 3D Surfaces</label>
-                    </div>
-                    <div class="setting-row">
-                        <div class="setting-label">Surface Resolution:</div>
-                        <div class="setting-control">
-                            <input type="number" id="surfaceResolution" value="{{ default_settings.surface_resolution }}" min="10" max="200" class="small-input">
-                        </div>
-                    </div>
-                    <div class="setting-row">
-                        <div class="setting-label">Depth Slices:</div>
-                        <div class="setting-control">
-                            <input type="number" id="surfaceDepthSlices" value="{{ default_settings.surface_depth_slices }}" min="0" max="20" class="small-input">
-                        </div>
-                    </div>
-                    <div class="setting-row">
-                        <div class="setting-label">Surface Opacity:</div>
-                        <div class="setting-control">
-                            <input type="number" id="surfaceOpacity" value="{{ default_settings.surface_opacity }}" min="0.1" max="1" step="0.1" class="small-input">
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="setting-category">
-                    <h3>VR Settings</h3>
-                    <div class="setting-row">
-                        <div class="setting-label">Point Size:</div>
-                        <div class="setting-control">
-                            <input type="number" id="vrPointSize" value="{{ default_settings.vr_point_size }}" min="0.001" max="0.1" step="0.001" class="small-input">
-                        </div>
-                    </div>
-                    <div class="setting-row">
-                        <div class="setting-control">
-                            <input type="number" id="depthOffsetPerLevel" value="{{ default_settings.depth_offset_per_level }}" min="0" max="0.5" step="0.01" class="small-input">
-                        </div>
-                    </div>
-                    <div class="setting-row">
-                        <div class="setting-label">Font Size Multiplier:</div>
-                        <div class="setting-control">
-                            <input type="number" id="fontSizeMultiplier" value="{{ default_settings.font_size_multiplier }}" min="0.5" max="3" step="0.1" class="small-input">
-                        </div>
-                    </div>
-                    <div class="setting-row">
-                        <div class="setting-label">Font Family:</div>
-                        <div class="setting-control">
-                            <select id="fontFamily">
-                                <option value="Arial" {% if default_settings.font_family == 'Arial' %}selected{% endif %}>Arial</option>
-                                <option value="Verdana" {% if default_settings.font_family == 'Verdana' %}selected{% endif %}>Verdana</option>
-                                <option value="Helvetica" {% if default_settings.font_family == 'Helvetica' %}selected{% endif %}>Helvetica</option>
-                                <option value="Times New Roman" {% if default_settings.font_family == 'Times New Roman' %}selected{% endif %}>Times New Roman</option>
-                                <option value="Courier New" {% if default_settings.font_family == 'Courier New' %}selected{% endif %}>Courier New</option>
-                                <option value="Georgia" {% if default_settings.font_family == 'Georgia' %}selected{% endif %}>Georgia</option>
-                            </select>
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="setting-category">
-                    <h3>Coordinate Settings</h3>
-                    <div class="checkbox-group">
-                        <input type="checkbox" id="invertDepth" checked>
-                        <label for="invertDepth">Invert Depth (positive down)</label>
-                    </div>
-                    <div class="checkbox-group">
-                        <input type="checkbox" id="centerCoordinates" checked>
-                        <label for="centerCoordinates">Center Coordinates</label>
-                    </div>
-                </div>
-            </div>
-        </div>
-    </div>
-
-    <script>
-        // Define color palettes (simplified versions)
-        const COLOR_PALETTES = {
-            'Viridis': ['#440154', '#482878', '#3e4989', '#31688e', '#26828e', '#1f9e89', '#35b779', '#6ece58', '#b5de2b', '#fde725'],
-            'Plasma': ['#0d0887', '#46039f', '#7201a8', '#9c179e', '#bd3786', '#d8576b', '#ed7953', '#fb9f3a', '#fdca26', '#f0f921'],
-            'Inferno': ['#000004', '#1b0c41', '#4a0c6b', '#781c6d', '#a52c60', '#cf4446', '#ed6925', '#fb9b06', '#f7d03c', '#fcffa4'],
-            'Magma': ['#000004', '#180f3d', '#440f76', '#721f81', '#9e2f7f', '#cd4071', '#f1605d', '#fd9668', '#feca8d', '#fcfdbf'],
-            'Cividis': ['#00204d', '#00336f', '#2f4880', '#575d8e', '#77729c', '#9589a9', '#b1a2b6', '#cbbcc2', '#e3d7cf', '#fcf5d6'],
-            'Seismic': ['#0000ff', '#4040ff', '#8080ff', '#c0c0ff', '#ffffff', '#ffc0c0', '#ff8080', '#ff4040', '#ff0000'],
-            'Rainbow': ['#9400d3', '#4b0082', '#0000ff', '#00ff00', '#ffff00', '#ff7f00', '#ff0000'],
-            'Standard': ['#ff0000', '#ffa500', '#ffff00', '#00ff00', '#0000ff'],
-            'RdBu': ['#67001f', '#b2182b', '#d6604d', '#f4a582', '#fddbc7', '#f7f7f7', '#d1e5f0', '#92c5de', '#4393c3', '#2166ac', '#053061'],
-            'Spectral': ['#9e0142', '#d53e4f', '#f46d43', '#fdae61', '#fee08b', '#ffffbf', '#e6f598', '#abdda4', '#66c2a5', '#3288bd', '#5e4fa2'],
-            'Blues': ['#f7fbff', '#deebf7', '#c6dbef', '#9ecae1', '#6baed6', '#4292c6', '#2171b5', '#08519c', '#08306b'],
-            'Greens': ['#f7fcf5', '#e5f5e0', '#c7e9c0', '#a1d99b', '#74c476', '#41ab5d', '#238b45', '#006d2c', '#00441b'],
-            'Oranges': ['#fff5eb', '#fee6ce', '#fdd0a2', '#fdae6b', '#fd8d3c', '#f16913', '#d94801', '#a63603', '#7f2704'],
-            'Turbo': ['#23171b', '#453a79', '#6575b2', '#84b2d6', '#a6edd8', '#ccf7b0', '#f5f18c', '#ffc35e', '#ff913e', '#ff5b3a', '#e62e46'],
-            'Thermal': ['#000000', '#400000', '#800000', '#c04000', '#ff8000', '#ffc040', '#ffff80', '#ffffff'],
-            'Ocean': ['#000080', '#0000ff', '#0080ff', '#00ffff', '#80ffff', '#ffffff'],
-            'Grayscale': ['#000000', '#404040', '#808080', '#c0c0c0', '#ffffff'],
-            'Geology': ['#8b4513', '#a0522d', '#cd853f', '#deb887', '#f5deb3', '#d2b48c', '#a52a2a', '#b22222'],
-            'Earth': ['#003865', '#005c87', '#008095', '#00a48f', '#55bc7c', '#aad469', '#ffeb56', '#ffbd2e'],
-            'HighContrast': ['#e63946', '#f18701', '#ffc857', '#a8dadc', '#457b9d', '#1d3557']
-        };
-        
-        let currentJobId = null;
-        let checkInterval = null;
-        let selectedPalette = "{{ default_settings.color_palette }}";
-        
-        // Initialize palette previews
-        function initPalettePreviews() {
-            // Update main preview
-            updatePalettePreview(selectedPalette);
-            
-            // Create mini previews for all palettes
-            for (const paletteName in COLOR_PALETTES) {
-                const miniPreview = document.getElementById('miniPreview' + paletteName);
-                if (miniPreview) {
-                    const colors = COLOR_PALETTES[paletteName];
-                    miniPreview.innerHTML = '';
-                    colors.forEach(color => {
-                        const div = document.createElement('div');
-                        div.className = 'palette-mini-color';
-                        div.style.backgroundColor = color;
-                        miniPreview.appendChild(div);
-                    });
-                }
-            }
-            
-            // Set selected palette in dropdown
-            document.getElementById('colorPaletteSelect').value = selectedPalette;
-        }
-        
-        function updatePalettePreview(paletteName) {
-            const palettePreview = document.getElementById('palettePreview');
-            const paletteInfo = document.getElementById('paletteInfo');
-            const colors = COLOR_PALETTES[paletteName] || COLOR_PALETTES['Viridis'];
-            
-            palettePreview.innerHTML = '';
-            colors.forEach(color => {
-                const div = document.createElement('div');
-                div.className = 'palette-color';
-                div.style.backgroundColor = color;
-                palettePreview.appendChild(div);
-            });
-            
-            paletteInfo.textContent = `${paletteName} palette (${colors.length} colors)`;
-            
-            // Update selection state
-            document.querySelectorAll('.palette-option').forEach(option => {
-                option.classList.remove('selected');
-                if (option.dataset.palette === paletteName) {
-                    option.classList.add('selected');
-                }
-            });
-            
-            // Update dropdown
-            document.getElementById('colorPaletteSelect').value = paletteName;
-            
-            selectedPalette = paletteName;
-        }
-        
-        function selectPalette(paletteName) {
-            updatePalettePreview(paletteName);
-        }
-        
-        document.getElementById('colorPaletteSelect').addEventListener('change', function(e) {
-            selectPalette(e.target.value);
-        });
-        
-        document.getElementById('fileInput').addEventListener('change', function(e) {
-            const file = e.target.files[0];
-            if (file) {
-                document.getElementById('fileInfo').style.display = 'block';
-                document.getElementById('fileInfo').innerHTML = `
-                    <strong>Selected:</strong> ${file.name}<br>
-                    <strong>Size:</strong> ${(file.size / 1024 / 1024).toFixed(2)} MB
-                `;
-                document.getElementById('processBtn').disabled = false;
-            }
-        });
-        
-        function processFile() {
-            const fileInput = document.getElementById('fileInput');
-            if (!fileInput.files[0]) {
-                alert('Please select a file first');
-                return;
-            }
-            
-            // Disable button and show status
-            document.getElementById('processBtn').disabled = true;
-            document.getElementById('statusArea').style.display = 'block';
-            document.getElementById('statusMessage').textContent = 'Uploading file...';
-            
-            // Create FormData
-            const formData = new FormData();
-            formData.append('file', fileInput.files[0]);
-            
-            const pipeInput = document.getElementById('pipeInput');
-            if(pipeInput.files.length > 0) {
-                formData.append('pipe_file', pipeInput.files[0]);
-            }
-            
-            // Add all settings to FormData
-            const settings = {
-                'col_idx_x': document.getElementById('colIdxX').value,
-                'col_idx_y': document.getElementById('colIdxY').value,
-                'col_idx_z': document.getElementById('colIdxZ').value,
-                'col_idx_amplitude': document.getElementById('colIdxAmplitude').value,
-                'threshold_percentile': document.getElementById('thresholdPercentile').value,
-                'iso_bins': document.getElementById('isoBins').value,
-                'max_points_per_layer': document.getElementById('maxPointsPerLayer').value,
-                'generate_surface': document.getElementById('generateSurface').checked,
-                'surface_resolution': document.getElementById('surfaceResolution').value,
-                'surface_depth_slices': document.getElementById('surfaceDepthSlices').value,
-                'surface_opacity': document.getElementById('surfaceOpacity').value,
-                'vr_point_size': document.getElementById('vrPointSize').value,
-                'depth_offset_per_level': document.getElementById('depthOffsetPerLevel').value,
-                'invert_depth': document.getElementById('invertDepth').checked,
-                'center_coordinates': document.getElementById('centerCoordinates').checked,
-                'generate_amplitude_surface': true,
-                'color_palette': selectedPalette,
-                'font_size_multiplier': document.getElementById('fontSizeMultiplier').value,
-                'font_family': document.getElementById('fontFamily').value
-            };
-            
-            for (const key in settings) {
-                formData.append(key, settings[key]);
-            }
-            
-            // Upload file
-            fetch('/upload', {
-                method: 'POST',
-                body: formData
-            })
-            .then(response => response.json())
-            .then(data => {
-                if (data.error) {
-                    alert('Error: ' + data.error);
-                    document.getElementById('processBtn').disabled = false;
-                    return;
-                }
-                
-                currentJobId = data.job_id;
-                document.getElementById('statusMessage').textContent = 'File uploaded, processing...';
-                
-                // Start checking status
-                checkInterval = setInterval(checkStatus, 2000);
-            })
-            .catch(error => {
-                alert('Upload failed: ' + error);
-                document.getElementById('processBtn').disabled = false;
-            });
-        }
-        
-        function checkStatus() {
-            if (!currentJobId) return;
-            
-            fetch(`/status/${currentJobId}`)
-                .then(response => response.json())
-                .then(data => {
-                    if (data.error) {
-                        clearInterval(checkInterval);
-                        document.getElementById('statusMessage').textContent = 'Error: ' + data.error;
-                        document.getElementById('processBtn').disabled = false;
-                        return;
-                    }
-                    
-                    document.getElementById('statusMessage').textContent = data.message;
-                    
-                    // Update progress based on status
-                    let progress = 0;
-                    if (data.status === 'processing') {
-                        progress = 50;
-                    } else if (data.status === 'completed') {
-                        progress = 100;
-                        clearInterval(checkInterval);
-                        document.getElementById('progressText').textContent = '100% - Complete!';
-                        document.getElementById('completedActions').style.display = 'flex';
-                    } else if (data.status === 'error') {
-                        progress = 0;
-                        clearInterval(checkInterval);
-                        document.getElementById('progressText').textContent = 'Error occurred';
-                        document.getElementById('processBtn').disabled = false;
-                    } else if (data.status === 'pending') {
-                        progress = 10;
-                    }
-                    
-                    document.getElementById('progressFill').style.width = progress + '%';
-                    document.getElementById('progressText').textContent = progress + '%';
-                })
-                .catch(error => {
-                    console.error('Status check failed:', error);
-                });
-        }
-        
-        function viewResult() {
-            if (currentJobId) {
-                window.open(`/view/${currentJobId}`, '_blank');
-            }
-        }
-        
-        function downloadResult() {
-            if (currentJobId) {
-                window.location.href = `/download/${currentJobId}`;
-            }
-        }
-        
-        function newFile() {
-            // Reset form
-            document.getElementById('fileInput').value = '';
-            document.getElementById('fileInfo').style.display = 'none';
-            document.getElementById('fileInfo').innerHTML = '';
-            document.getElementById('processBtn').disabled = true;
-            document.getElementById('statusArea').style.display = 'none';
-            document.getElementById('completedActions').style.display = 'none';
-            document.getElementById('progressFill').style.width = '0%';
-            document.getElementById('progressText').textContent = '0%';
-            
-            // Clean up old job
-            if (currentJobId) {
-                fetch(`/cleanup/${currentJobId}`);
-                currentJobId = null;
-            }
-            
-            if (checkInterval) {
-                clearInterval(checkInterval);
-                checkInterval = null;
-            }
-        }
-        
-        // Initialize on load
-        window.onload = function() {
-            initPalettePreviews();
-        };
-    </script>
-</body>
-</html>'''
-    
-    #Write template file
-    with open('templates/index.html', 'w', encoding='utf-8') as f:
-        f.write(html_template)
-    
-
-    app.run(debug=True, host='0.0.0.0', port=5006)
+    # Debugger and reloader only on request (GPR_DEBUG=1); threads keep uploads,
+    # event streams and file downloads from queueing behind each other
+    app.run(debug=os.environ.get('GPR_DEBUG') == '1', host='0.0.0.0', port=5006, threaded=True)
@@ -0,0 +1,349 @@
+// Everything is scoped to this handler; the page wires its controls with listeners below
+document.addEventListener('DOMContentLoaded', () => {
+    // Define color palettes (simplified versions)
+    const COLOR_PALETTES = {
+        'Viridis': ['#440154', '#482878', '#3e4989', '#31688e', '#26828e', '#1f9e89', '#35b779', '#6ece58', '#b5de2b', '#fde725'],
+        'Plasma': ['#0d0887', '#46039f', '#7201a8', '#9c179e', '#bd3786', '#d8576b', '#ed7953', '#fb9f3a', '#fdca26', '#f0f921'],
+        'Inferno': ['#000004', '#1b0c41', '#4a0c6b', '#781c6d', '#a52c60', '#cf4446', '#ed6925', '#fb9b06', '#f7d03c', '#fcffa4'],
+        'Magma': ['#000004', '#180f3d', '#440f76', '#721f81', '#9e2f7f', '#cd4071', '#f1605d', '#fd9668', '#feca8d', '#fcfdbf'],
+        'Cividis': ['#00204d', '#00336f', '#2f4880', '#575d8e', '#77729c', '#9589a9', '#b1a2b6', '#cbbcc2', '#e3d7cf', '#fcf5d6'],
+        'Seismic': ['#0000ff', '#4040ff', '#8080ff', '#c0c0ff', '#ffffff', '#ffc0c0', '#ff8080', '#ff4040', '#ff0000'],
+        'Rainbow': ['#9400d3', '#4b0082', '#0000ff', '#00ff00', '#ffff00', '#ff7f00', '#ff0000'],
+        'Standard': ['#ff0000', '#ffa500', '#ffff00', '#00ff00', '#0000ff'],
+        'RdBu': ['#67001f', '#b2182b', '#d6604d', '#f4a582', '#fddbc7', '#f7f7f7', '#d1e5f0', '#92c5de', '#4393c3', '#2166ac', '#053061'],
+        'Spectral': ['#9e0142', '#d53e4f', '#f46d43', '#fdae61', '#fee08b', '#ffffbf', '#e6f598', '#abdda4', '#66c2a5', '#3288bd', '#5e4fa2'],
+        'Blues': ['#f7fbff', '#deebf7', '#c6dbef', '#9ecae1', '#6baed6', '#4292c6', '#2171b5', '#08519c', '#08306b'],
+        'Greens': ['#f7fcf5', '#e5f5e0', '#c7e9c0', '#a1d99b', '#74c476', '#41ab5d', '#238b45', '#006d2c', '#00441b'],
+        'Oranges': ['#fff5eb', '#fee6ce', '#fdd0a2', '#fdae6b', '#fd8d3c', '#f16913', '#d94801', '#a63603', '#7f2704'],
+        'Turbo': ['#23171b', '#453a79', '#6575b2', '#84b2d6', '#a6edd8', '#ccf7b0', '#f5f18c', '#ffc35e', '#ff913e', '#ff5b3a', '#e62e46'],
+        'Thermal': ['#000000', '#400000', '#800000', '#c04000', '#ff8000', '#ffc040', '#ffff80', '#ffffff'],
+        'Ocean': ['#000080', '#0000ff', '#0080ff', '#00ffff', '#80ffff', '#ffffff'],
+        'Grayscale': ['#000000', '#404040', '#808080', '#c0c0c0', '#ffffff'],
+        'Geology': ['#8b4513', '#a0522d', '#cd853f', '#deb887', '#f5deb3', '#d2b48c', '#a52a2a', '#b22222'],
+        'Earth': ['#003865', '#005c87', '#008095', '#00a48f', '#55bc7c', '#aad469', '#ffeb56', '#ffbd2e'],
+        'HighContrast': ['#e63946', '#f18701', '#ffc857', '#a8dadc', '#457b9d', '#1d3557']
+    };
+
+    let currentJobId = null;
+    let resultOpened = false;  // viewer/download may still need the job's files
+    let jobFinished = false;   // worker is done with the job's files (completed or error)
+    let statusEvents = null;
+    let selectedPalette = document.getElementById('colorPaletteSelect').value;
+
+    // Initialize palette previews
+    function initPalettePreviews() {
+        // Update main preview
+        updatePalettePreview(selectedPalette);
+
+        // Create mini previews for all palettes
+        for (const paletteName in COLOR_PALETTES) {
+            const miniPreview = document.getElementById('miniPreview' + paletteName);
+            if (miniPreview) {
+                const colors = COLOR_PALETTES[paletteName];
+                miniPreview.innerHTML = '';
+                colors.forEach(color => {
+                    const div = document.createElement('div');
+                    div.className = 'palette-mini-color';
+                    div.style.backgroundColor = color;
+                    miniPreview.appendChild(div);
+                });
+            }
+        }
+
+        // Set selected palette in dropdown
+        document.getElementById('colorPaletteSelect').value = selectedPalette;
+    }
+
+    function updatePalettePreview(paletteName) {
+        const palettePreview = document.getElementById('palettePreview');
+        const paletteInfo = document.getElementById('paletteInfo');
+        const colors = COLOR_PALETTES[paletteName] || COLOR_PALETTES['Viridis'];
+
+        palettePreview.innerHTML = '';
+        colors.forEach(color => {
+            const div = document.createElement('div');
+            div.className = 'palette-color';
+            div.style.backgroundColor = color;
+            palettePreview.appendChild(div);
+        });
+
+        paletteInfo.textContent = `${paletteName} palette (${colors.length} colors)`;
+
+        // Update selection state
+        document.querySelectorAll('.palette-option').forEach(option => {
+            option.classList.remove('selected');
+            if (option.dataset.palette === paletteName) {
+                option.classList.add('selected');
+            }
+        });
+
+        // Update dropdown
+        document.getElementById('colorPaletteSelect').value = paletteName;
+
+        selectedPalette = paletteName;
+    }
+
+    function selectPalette(paletteName) {
+        updatePalettePreview(paletteName);
+    }
+
+    document.getElementById('colorPaletteSelect').addEventListener('change', function(e) {
+        selectPalette(e.target.value);
+    });
+
+    document.getElementById('fileInput').addEventListener('change', function(e) {
+        const file = e.target.files[0];
+        if (file) {
+            document.getElementById('fileInfo').style.display = 'block';
+            document.getElementById('fileInfo').innerHTML = `
+                <strong>Selected:</strong> ${file.name}<br>
+                <strong>Size:</strong> ${(file.size / 1024 / 1024).toFixed(2)} MB
+            `;
+            document.getElementById('processBtn').disabled = false;
+        }
+    });
+
+    // Settings form fields by setting name, looked up once; checkboxes send .checked, the rest .value
+    const settingFields = Object.entries({
+        col_idx_x: 'colIdxX',
+        col_idx_y: 'colIdxY',
+        col_idx_z: 'colIdxZ',
+        col_idx_amplitude: 'colIdxAmplitude',
+        threshold_percentile: 'thresholdPercentile',
+        iso_bins: 'isoBins',
+        max_points_per_layer: 'maxPointsPerLayer',
+        generate_surface: 'generateSurface',
+        surface_resolution: 'surfaceResolution',
+        surface_depth_slices: 'surfaceDepthSlices',
+        surface_opacity: 'surfaceOpacity',
+        vr_point_size: 'vrPointSize',
+        depth_offset_per_level: 'depthOffsetPerLevel',
+        invert_depth: 'invertDepth',
+        center_coordinates: 'centerCoordinates',
+        font_size_multiplier: 'fontSizeMultiplier',
+        font_family: 'fontFamily'
+    }).map(([key, id]) => [key, document.getElementById(id)]);
+
+    // Large CSVs go up in fixed-size chunks, appended on disk as they arrive
+    const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+
+    // PUT one chunk with XMLHttpRequest, which (unlike fetch) reports upload progress
+    function putChunk(url, contentRange, chunk, onProgress) {
+        return new Promise((resolve, reject) => {
+            const xhr = new XMLHttpRequest();
+            xhr.open('PUT', url);
+            xhr.setRequestHeader('Content-Type', 'application/octet-stream');
+            xhr.setRequestHeader('Content-Range', contentRange);
+            xhr.upload.onprogress = (e) => onProgress(e.loaded);
+            xhr.onload = () => {
+                if (xhr.status >= 200 && xhr.status < 300) return resolve();
+                // Proxies and server errors may answer with HTML rather than JSON
+                let message = 'Upload failed (HTTP ' + xhr.status + ')';
+                try {
+                    message = JSON.parse(xhr.responseText).error || message;
+                } catch (e) {}
+                reject(new Error(message));
+            };
+            xhr.onerror = () => reject(new Error('Network error'));
+            xhr.send(chunk);
+        });
+    }
+
+    async function uploadInChunks(file) {
+        const begin = new FormData();
+        begin.append('filename', file.name);
+        begin.append('size', file.size);
+        const started = await fetch('/upload/begin', { method: 'POST', body: begin }).then(r => r.json());
+        if (started.error) throw new Error(started.error);
+
+        const showUploaded = (bytes) => {
+            const percent = file.size ? Math.floor(bytes * 100 / file.size) : 100;
+            setProgress(percent, percent + '% (upload)');
+        };
+        for (let start = 0; start < file.size; start += UPLOAD_CHUNK_SIZE) {
+            const chunk = file.slice(start, start + UPLOAD_CHUNK_SIZE);
+            await putChunk(`/upload/${started.upload_id}`,
+                `bytes ${start}-${start + chunk.size - 1}/${file.size}`,
+                chunk, (loaded) => showUploaded(start + loaded));
+        }
+        showUploaded(file.size);
+        return started.upload_id;
+    }
+
+    function processFile() {
+        const fileInput = document.getElementById('fileInput');
+        if (!fileInput.files[0]) {
+            alert('Please select a file first');
+            return;
+        }
+
+        // Disable button and show status
+        document.getElementById('processBtn').disabled = true;
+        document.getElementById('statusArea').style.display = 'block';
+        setStatusMessage('Uploading file...');
+
+        // Create FormData (the CSV itself is sent separately in chunks)
+        const formData = new FormData();
+
+        const pipeInput = document.getElementById('pipeInput');
+        if(pipeInput.files.length > 0) {
+            formData.append('pipe_file', pipeInput.files[0]);
+        }
+
+        // Add all settings to FormData
+        for (const [key, field] of settingFields) {
+            formData.append(key, field.type === 'checkbox' ? field.checked : field.value);
+        }
+        formData.append('generate_amplitude_surface', true);
+        formData.append('color_palette', selectedPalette);
+
+        // Upload file, then start processing it
+        uploadInChunks(fileInput.files[0])
+        .then(uploadId => {
+            formData.append('upload_id', uploadId);
+            return fetch('/upload', {
+                method: 'POST',
+                body: formData
+            });
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                alert('Error: ' + data.error);
+                document.getElementById('processBtn').disabled = false;
+                return;
+            }
+
+            currentJobId = data.job_id;
+            resultOpened = false;
+            jobFinished = false;
+            setStatusMessage('File uploaded, processing...');
+
+            // Follow status updates
+            watchStatus(currentJobId);
+        })
+        .catch(error => {
+            alert('Upload failed: ' + error);
+            document.getElementById('processBtn').disabled = false;
+        });
+    }
+
+    // Status elements, and the last values written to them so repeated updates touch nothing
+    const statusMessage = document.getElementById('statusMessage');
+    const progressFill = document.getElementById('progressFill');
+    const progressText = document.getElementById('progressText');
+    let lastMessage = null, lastProgress = null, lastProgressLabel = null;
+
+    function setStatusMessage(message) {
+        if (message === lastMessage) return;
+        statusMessage.textContent = lastMessage = message;
+    }
+
+    function setProgress(progress, label = progress + '%') {
+        if (progress !== lastProgress) {
+            progressFill.style.width = progress + '%';
+            lastProgress = progress;
+        }
+        if (label !== lastProgressLabel) {
+            progressText.textContent = lastProgressLabel = label;
+        }
+    }
+
+    function watchStatus(jobId) {
+        // The server pushes every status change; the stream ends on completion or error
+        statusEvents = new EventSource(`/events/${jobId}`);
+        statusEvents.onmessage = (e) => {
+            const data = JSON.parse(e.data);
+            if (data.error) {
+                jobFinished = true;
+                closeStatusEvents();
+                setStatusMessage('Error: ' + data.error);
+                document.getElementById('processBtn').disabled = false;
+                return;
+            }
+
+            setStatusMessage(data.message);
+
+            // Update progress based on status
+            if (data.status === 'completed') {
+                jobFinished = true;
+                closeStatusEvents();
+                setProgress(100, '100% - Complete!');
+                document.getElementById('completedActions').style.display = 'flex';
+            } else if (data.status === 'error') {
+                jobFinished = true;
+                closeStatusEvents();
+                setProgress(0, 'Error occurred');
+                document.getElementById('processBtn').disabled = false;
+            } else {
+                setProgress(data.progress || 0);
+            }
+        };
+        statusEvents.onerror = () => {
+            // EventSource retries dropped connections itself; only a refused stream is final
+            if (statusEvents && statusEvents.readyState === EventSource.CLOSED) {
+                console.error('Status stream closed');
+                closeStatusEvents();
+            }
+        };
+    }
+
+    function closeStatusEvents() {
+        if (statusEvents) {
+            statusEvents.close();
+            statusEvents = null;
+        }
+    }
+
+    function viewResult() {
+        if (currentJobId) {
+            resultOpened = true;
+            window.open(`/view/${currentJobId}`, '_blank');
+        }
+    }
+
+    function downloadResult() {
+        if (currentJobId) {
+            resultOpened = true;
+            window.location.href = `/download/${currentJobId}`;
+        }
+    }
+
+    function newFile() {
+        // Reset form
+        document.getElementById('fileInput').value = '';
+        document.getElementById('fileInfo').style.display = 'none';
+        document.getElementById('fileInfo').innerHTML = '';
+        document.getElementById('processBtn').disabled = true;
+        document.getElementById('statusArea').style.display = 'none';
+        document.getElementById('completedActions').style.display = 'none';
+        setProgress(0);
+
+        // Clean up old job
+        // A beacon is still delivered if the page goes away right after the click
+        if (currentJobId) {
+            navigator.sendBeacon(`/cleanup/${currentJobId}`);
+            currentJobId = null;
+        }
+
+        closeStatusEvents();
+    }
+
+    // Leaving the page abandons a finished job whose results were never opened;
+    // a job still processing is left to its worker
+    window.addEventListener('pagehide', () => {
+        if (currentJobId && jobFinished && !resultOpened) navigator.sendBeacon(`/cleanup/${currentJobId}`);
+    });
+
+    // Buttons and palette tiles
+    document.getElementById('processBtn').addEventListener('click', processFile);
+    document.getElementById('viewBtn').addEventListener('click', viewResult);
+    document.getElementById('downloadBtn').addEventListener('click', downloadResult);
+    document.getElementById('newFileBtn').addEventListener('click', newFile);
+    document.getElementById('paletteGrid').addEventListener('click', (e) => {
+        const option = e.target.closest('.palette-option');
+        if (option) selectPalette(option.dataset.palette);
+    });
+
+    initPalettePreviews();
+});